@@ -0,0 +1,136 @@
+"""Totais do relatório geral por função e por tipo de ocorrência.
+
+O bônus de cada funcionário é avaliado em Python (as regras dependem da
+ordem das ocorrências); a consolidação por função, por tipo e geral é feita
+pelo banco com GROUPING SETS, juntando a função atual de cada funcionário.
+Em período aberto o banco recebe só o resumo de cada funcionário (percentual,
+se recebe e o desconto de cada tipo que reduz o bônus) em arrays; em período
+fechado lê o bônus congelado, classificando os tipos pelas regras gravadas no
+fechamento. As duas fontes passam pelas mesmas consultas.
+"""
+LIMITE_TIPOS_IMPACTO = 5
+
+
+class ResultadosCompactos:
+    """Resumo dos resultados de avaliar_bonus usado nos totais; os detalhes
+    de cada funcionário não são guardados"""
+
+    def __init__(self, regras):
+        self._regras = regras
+        self.funcionarios = []
+        self.recebe_bonus = []
+        self.bonus_percentual = []
+        self.impactos = ([], [], [])        # funcionario_id, tipo, desconto
+
+    def acrescentar(self, resultado):
+        self.funcionarios.append(resultado['funcionario_id'])
+        self.recebe_bonus.append(resultado['recebe_bonus'])
+        self.bonus_percentual.append(float(resultado['bonus_percentual']))
+        for detalhe in resultado['detalhes']:
+            # Tipos de categoria bonus não contam como impacto
+            if getattr(self._regras.get(detalhe['tipo']), 'categoria', None) != 'bonus':
+                self.impactos[0].append(resultado['funcionario_id'])
+                self.impactos[1].append(detalhe['tipo'])
+                self.impactos[2].append(float(detalhe['desconto']))
+
+
+async def agregar_resultados(db, compactos, limite_tipos=LIMITE_TIPOS_IMPACTO):
+    """Totais por função e geral, com os tipos que mais reduziram o bônus"""
+    return await _agregar(
+        db,
+        "SELECT * FROM unnest(%s::int[], %s::boolean[], %s::float8[])",
+        (compactos.funcionarios, compactos.recebe_bonus, compactos.bonus_percentual),
+        "SELECT * FROM unnest(%s::int[], %s::text[], %s::float8[])",
+        compactos.impactos,
+        limite_tipos
+    )
+
+
+async def agregar_fechamento(db, periodo_id, limite_tipos=LIMITE_TIPOS_IMPACTO):
+    """Mesmos totais de agregar_resultados, direto do bônus congelado do período"""
+    return await _agregar(
+        db,
+        """
+            SELECT funcionario_id, recebe_bonus, bonus_percentual
+            FROM bonus_fechados
+            WHERE periodo_id = %s
+        """,
+        (periodo_id,),
+        """
+            SELECT b.funcionario_id, d.tipo, d.desconto
+            FROM bonus_fechados b
+            JOIN periodos_fechados p ON p.id = b.periodo_id
+            CROSS JOIN LATERAL jsonb_to_recordset(b.detalhes) AS d(tipo TEXT, desconto DOUBLE PRECISION)
+            WHERE b.periodo_id = %s
+              AND (p.regras -> d.tipo ->> 'categoria') IS DISTINCT FROM 'bonus'
+        """,
+        (periodo_id,),
+        limite_tipos
+    )
+
+
+async def _agregar(db, sql_resultados, params_resultados, sql_impactos, params_impactos, limite_tipos):
+    """Consolida (funcionario_id, recebe_bonus, bonus_percentual) e
+    (funcionario_id, tipo, desconto) vindos das consultas recebidas"""
+    # GROUPING(f.funcao) = 1 marca a linha do total geral (funcao NULL
+    # também aparece para funcionários sem função)
+    totais = await db.fetchall(f"""
+        WITH resultados (funcionario_id, recebe_bonus, bonus_percentual) AS ({sql_resultados})
+        SELECT
+            f.funcao,
+            GROUPING(f.funcao) = 1 AS geral,
+            COUNT(*) AS total_funcionarios,
+            COUNT(*) FILTER (WHERE r.recebe_bonus) AS recebem_bonus,
+            COUNT(*) FILTER (WHERE NOT r.recebe_bonus) AS perdem_bonus,
+            COALESCE(ROUND(AVG(r.bonus_percentual)::numeric, 2), 0)::float AS media_bonus
+        FROM resultados r
+        LEFT JOIN funcionarios f ON f.id = r.funcionario_id
+        GROUP BY GROUPING SETS ((f.funcao), ())
+        ORDER BY geral DESC, f.funcao
+    """, params_resultados)
+    impactos = await db.fetchall(f"""
+        WITH impactos (funcionario_id, tipo, desconto) AS ({sql_impactos}),
+        por_tipo AS (
+            SELECT
+                f.funcao,
+                GROUPING(f.funcao) = 1 AS geral,
+                i.tipo,
+                COUNT(*) AS funcionarios,
+                ROUND(SUM(i.desconto)::numeric, 2)::float AS desconto_total
+            FROM impactos i
+            LEFT JOIN funcionarios f ON f.id = i.funcionario_id
+            GROUP BY GROUPING SETS ((f.funcao, i.tipo), (i.tipo))
+        )
+        SELECT funcao, geral, tipo, funcionarios, desconto_total
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY geral, funcao ORDER BY desconto_total DESC, funcionarios DESC, tipo
+            ) AS posicao
+            FROM por_tipo
+        ) ranking
+        WHERE posicao <= %s
+        ORDER BY geral DESC, funcao, posicao
+    """, (*params_impactos, limite_tipos))
+
+    tipos = {}
+    for row in impactos:
+        tipos.setdefault((row['geral'], row['funcao']), []).append({
+            "tipo": row['tipo'],
+            "funcionarios": row['funcionarios'],
+            "desconto_total": row['desconto_total']
+        })
+
+    agregados = {"geral": None, "por_funcao": []}
+    for row in totais:
+        total = {
+            "total_funcionarios": row['total_funcionarios'],
+            "recebem_bonus": row['recebem_bonus'],
+            "perdem_bonus": row['perdem_bonus'],
+            "media_bonus": row['media_bonus'],
+            "tipos_impacto": tipos.get((row['geral'], row['funcao']), [])
+        }
+        if row['geral']:
+            agregados["geral"] = total
+        else:
+            agregados["por_funcao"].append({"funcao": row['funcao'], **total})
+    return agregados
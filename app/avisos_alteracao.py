@@ -0,0 +1,171 @@
+"""Escuta dos avisos de alteração do banco (LISTEN/NOTIFY).
+
+Triggers em funcionarios, ocorrencias e regras_bonus avisam no canal
+`bonificacao_alteracoes` a cada comando. Cada processo do servidor mantém
+uma conexão dedicada escutando o canal e, ao receber um aviso de outro
+processo (ou de uma gravação por fora da API), descarta os próprios caches:
+regras, cadastros de funcionários e contadores do dashboard. As gravações do
+próprio processo já invalidam os caches no router e são ignoradas.
+
+A escuta roda em uma thread com uma conexão psycopg2 (funciona nos dois
+modos do banco e no executável). Se a conexão cair, ela é reaberta com
+espera crescente e, como avisos podem ter se perdido nesse intervalo, todos
+os caches são descartados a cada conexão. Avisos com conteúdo inválido (ex.:
+um NOTIFY manual no canal) são registrados e ignorados; qualquer outro erro na
+escuta também leva a uma nova conexão.
+
+O cache de relatórios não depende dos avisos: a chave já inclui a marca
+d'água lida do banco.
+"""
+import asyncio
+import json
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+from app import cache_funcionarios, contadores_dashboard
+from app.database import conectar, origem_processo
+from app.regras import invalidar_regras
+
+CANAL = "bonificacao_alteracoes"
+ATIVA = os.getenv("BONIFICACAO_AVISOS", "1") != "0"
+# Sem avisos por esse tempo, um SELECT 1 confirma que a conexão continua viva
+VERIFICAR_APOS = 30.0
+ESPERA_MAXIMA = 30.0
+
+_lock = threading.Lock()
+_conectada = False
+_avisos = 0
+_ignorados = 0
+_invalidos = 0
+_reconexoes = 0
+_descartes_completos = 0
+
+
+def _descartar(tabelas):
+    """Descarta os caches que dependem das tabelas (no loop de eventos)"""
+    if "regras_bonus" in tabelas:
+        invalidar_regras()
+    if "funcionarios" in tabelas:
+        cache_funcionarios.invalidar_funcionarios()
+    if "funcionarios" in tabelas or "ocorrencias" in tabelas:
+        contadores_dashboard.invalidar()
+
+
+def _descartar_tudo():
+    global _descartes_completos
+    with _lock:
+        _descartes_completos += 1
+    _descartar({"regras_bonus", "funcionarios", "ocorrencias"})
+
+
+def _ler_avisos(conn):
+    """Tabelas alteradas por outros processos nos avisos pendentes"""
+    global _avisos, _ignorados, _invalidos
+    conn.poll()
+    tabelas = set()
+    recebidos = ignorados = invalidos = 0
+    while conn.notifies:
+        payload = conn.notifies.pop(0).payload
+        try:
+            aviso = json.loads(payload)
+            origem, tabela = aviso['origem'], aviso['tabela']
+        except (ValueError, TypeError, KeyError):
+            print(f"⚠️ Aviso de alteração inválido ignorado: {payload[:200]!r}")
+            invalidos += 1
+            continue
+        if origem == origem_processo():
+            ignorados += 1
+        else:
+            recebidos += 1
+            tabelas.add(tabela)
+    with _lock:
+        _avisos += recebidos
+        _ignorados += ignorados
+        _invalidos += invalidos
+    return tabelas
+
+
+def _escutar(loop, parar):
+    global _conectada, _reconexoes
+    falhas = 0
+    while not parar.is_set():
+        conn = None
+        try:
+            conn = conectar()
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {CANAL}")
+            with _lock:
+                _conectada = True
+            falhas = 0
+            loop.call_soon_threadsafe(_descartar_tudo)
+
+            ultima_atividade = time.monotonic()
+            while not parar.is_set():
+                if select.select([conn], [], [], 1.0)[0]:
+                    tabelas = _ler_avisos(conn)
+                    if tabelas:
+                        loop.call_soon_threadsafe(_descartar, tabelas)
+                    ultima_atividade = time.monotonic()
+                elif time.monotonic() - ultima_atividade >= VERIFICAR_APOS:
+                    cursor.execute("SELECT 1")
+                    ultima_atividade = time.monotonic()
+        except (psycopg2.Error, OSError) as e:
+            print(f"⚠️ Escuta de alterações desconectada: {e}")
+        except Exception as e:
+            if loop.is_closed():
+                # Loop de eventos encerrado: o servidor está parando
+                return
+            print(f"⚠️ Erro na escuta de alterações, reconectando: {e!r}")
+        finally:
+            with _lock:
+                if _conectada and not parar.is_set():
+                    _reconexoes += 1
+                _conectada = False
+            if conn is not None:
+                try:
+                    conn.close()
+                except psycopg2.Error:
+                    pass
+        parar.wait(min(ESPERA_MAXIMA, 0.5 * 2 ** falhas))
+        falhas += 1
+
+
+_thread = None
+_parar = None
+
+
+async def iniciar_escuta():
+    global _thread, _parar
+    if _thread is None and ATIVA:
+        _parar = threading.Event()
+        _thread = threading.Thread(
+            target=_escutar, args=(asyncio.get_running_loop(), _parar),
+            name="avisos-alteracao", daemon=True
+        )
+        _thread.start()
+
+
+async def parar_escuta():
+    global _thread
+    if _thread is not None:
+        _parar.set()
+        await asyncio.to_thread(_thread.join, 5)
+        _thread = None
+
+
+def estatisticas_avisos():
+    with _lock:
+        return {
+            "ativa": _thread is not None and _thread.is_alive(),
+            "conectada": _conectada,
+            "avisos": _avisos,
+            "ignorados": _ignorados,
+            "invalidos": _invalidos,
+            "reconexoes": _reconexoes,
+            "descartes_completos": _descartes_completos,
+        }
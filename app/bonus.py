@@ -0,0 +1,261 @@
+from datetime import timedelta
+
+from app.database_async import conexao
+from app.regras import obter_regras
+
+
+def avaliar_bonus(funcionario_id, nome, ocorrencias_raw, regras):
+    """Aplica as regras de bônus sobre as ocorrências de um funcionário no período.
+
+    `ocorrencias_raw` deve vir ordenada por data e conter as chaves
+    `id`, `tipo` e `anula_ocorrencia_id`; `regras` é o mapeamento
+    tipo -> Regra de `app.regras`.
+    """
+    contadores, anuladas = contar_ocorrencias(ocorrencias_raw)
+    return aplicar_regras(funcionario_id, nome, contadores, anuladas, regras)
+
+
+def contar_ocorrencias(ocorrencias_raw):
+    """Quantidade de cada tipo efetivo, na ordem da primeira ocorrência, e
+    quantas ocorrências foram anuladas por atestado"""
+    # Processa ocorrências considerando anulações
+    ocorrencias_efetivas = []
+    ocorrencias_anuladas = set()
+
+    # Identifica ocorrências que foram anuladas
+    for row in ocorrencias_raw:
+        if row['anula_ocorrencia_id']:
+            ocorrencias_anuladas.add(row['anula_ocorrencia_id'])
+
+    # Processa ocorrências não anuladas
+    for row in ocorrencias_raw:
+        if row['id'] in ocorrencias_anuladas:
+            continue
+        if row['anula_ocorrencia_id']:
+            ocorrencias_efetivas.append('atestado')
+        else:
+            ocorrencias_efetivas.append(row['tipo'])
+
+    # Contadores automáticos para todas as regras com limite; a ordem das
+    # chaves é a ordem da primeira ocorrência de cada tipo
+    contadores = {}
+    for ocorrencia in ocorrencias_efetivas:
+        contadores[ocorrencia] = contadores.get(ocorrencia, 0) + 1
+
+    return contadores, len(ocorrencias_anuladas)
+
+
+def avaliar_bonus_totais(funcionario_id, nome, totais, regras):
+    """Mesmo resultado de `avaliar_bonus`, a partir das linhas de totais_mensais.
+
+    Só vale para períodos de meses inteiros sem anulação entre meses
+    diferentes (`anulacoes_outro_mes` zerado em todas as linhas).
+    """
+    contadores = {}
+    anuladas = 0
+    for total in sorted(totais, key=lambda t: (t['primeira_data'], t['primeiro_id'])):
+        contadores[total['tipo']] = contadores.get(total['tipo'], 0) + total['quantidade']
+        anuladas += total['anulacoes']
+
+    return aplicar_regras(funcionario_id, nome, contadores, anuladas, regras)
+
+
+def aplicar_regras(funcionario_id, nome, contadores, ocorrencias_anuladas, regras):
+    """Calcula o bônus a partir da quantidade de cada tipo efetivo.
+
+    `contadores` é tipo -> quantidade, na ordem da primeira ocorrência de
+    cada tipo no período: uma regra que elimina o bônus só impede os
+    bônus/descontos de tipos que aparecem depois dela.
+    """
+    bonus_final = 100.0
+    detalhes = []
+    perdeu_bonus = False
+    bonus_positivos = 0.0
+
+    for ocorrencia in contadores:
+        regra = regras.get(ocorrencia)
+        if not regra:
+            continue
+
+        categoria = regra.categoria
+        desconto = regra.desconto
+        limite = regra.limite
+        quantidade = contadores.get(ocorrencia, 0)
+
+        if categoria == 'elimina':
+            perdeu_bonus = True
+            detalhes.append({"tipo": ocorrencia, "impacto": "Elimina bônus", "desconto": 100})
+        elif categoria == 'limite' and ocorrencia == 'atestado':
+            if quantidade > limite:
+                perdeu_bonus = True
+                detalhes.append({
+                    "tipo": ocorrencia,
+                    "impacto": f"Excedeu limite de {limite} atestados ({quantidade})",
+                    "desconto": 100
+                })
+        elif categoria == 'percentual' and not perdeu_bonus:
+            # Aplica desconto para cada ocorrência (sem limite)
+            total_desconto = desconto * quantidade
+            bonus_final -= total_desconto
+            detalhes.append({
+                "tipo": ocorrencia,
+                "impacto": f"Reduz {total_desconto}% ({quantidade} ocorrência(s))",
+                "desconto": total_desconto
+            })
+        elif categoria == 'bonus' and not perdeu_bonus:
+            # Verifica limite para supermetas
+            if limite is not None:
+                # Aplica apenas até o limite permitido
+                quantidade_aplicavel = min(quantidade, limite)
+                bonus_aplicavel = desconto * quantidade_aplicavel
+                if quantidade_aplicavel > 0:
+                    bonus_positivos += bonus_aplicavel
+                    detalhes.append({
+                        "tipo": ocorrencia,
+                        "impacto": f"Adiciona {bonus_aplicavel}% ({quantidade_aplicavel} de {quantidade} dentro do limite)",
+                        "desconto": bonus_aplicavel
+                    })
+            else:
+                # Sem limite, aplica todas as ocorrências
+                bonus_aplicavel = desconto * quantidade
+                bonus_positivos += bonus_aplicavel
+                detalhes.append({
+                    "tipo": ocorrencia,
+                    "impacto": f"Adiciona {bonus_aplicavel}% ({quantidade} ocorrência(s))",
+                    "desconto": bonus_aplicavel
+                })
+
+    if perdeu_bonus:
+        bonus_final = 0
+    else:
+        # Aplica bônus positivos (não pode ultrapassar 200%)
+        bonus_final = min(200, bonus_final + bonus_positivos)
+        bonus_final = max(0, bonus_final)
+
+    return {
+        "funcionario_id": funcionario_id,
+        "nome": nome,
+        "bonus_percentual": round(bonus_final, 2),
+        "recebe_bonus": bonus_final > 0,
+        "total_ocorrencias": sum(contadores.values()),
+        "atestados": contadores.get('atestado', 0),
+        "detalhes": detalhes,
+        "ocorrencias_anuladas": ocorrencias_anuladas,
+        "bonus_positivos": round(bonus_positivos, 2)
+    }
+
+
+async def iterar_bonus_lote(data_inicio: str, data_fim: str, tamanho_lote: int = 2000, db=None, regras=None):
+    """Calcula o bônus de todos os funcionários ativos em uma única passada.
+
+    Faz uma única consulta para todas as ocorrências do período, em vez de
+    três consultas por funcionário; as regras vêm do cache. As linhas são
+    lidas por um cursor no servidor e cada resultado é entregue assim que o
+    funcionário é avaliado, então a memória não cresce com o quadro.
+    Passe `db` para ler dentro de uma transação já aberta e `regras` para
+    avaliar com regras já carregadas.
+    """
+    if regras is None:
+        regras = (await obter_regras()).por_tipo
+
+    if db is None:
+        async with conexao() as db:
+            async for resultado in _iterar_bonus(db, data_inicio, data_fim, tamanho_lote, regras):
+                yield resultado
+    else:
+        async for resultado in _iterar_bonus(db, data_inicio, data_fim, tamanho_lote, regras):
+            yield resultado
+
+
+async def _iterar_bonus(db, data_inicio, data_fim, tamanho_lote, regras):
+    async for grupo in _iterar_grupos(db, data_inicio, data_fim, tamanho_lote):
+        yield _avaliar_grupo(grupo, regras)
+
+
+async def _iterar_grupos(db, data_inicio, data_fim, tamanho_lote):
+    """Linhas (funcionário + ocorrências do período) agrupadas por funcionário ativo"""
+    # LEFT JOIN mantém no relatório os funcionários sem ocorrências no período
+    linhas = db.stream("""
+        SELECT
+            f.id AS funcionario_id,
+            f.nome,
+            o.id,
+            o.tipo,
+            o.data,
+            o.anula_ocorrencia_id
+        FROM funcionarios f
+        LEFT JOIN ocorrencias o
+            ON o.funcionario_id = f.id AND o.data >= %s AND o.data <= %s
+        WHERE f.ativo = TRUE
+        ORDER BY f.id, o.data, o.id
+    """, (data_inicio, data_fim), tamanho_lote)
+
+    atual = None
+    grupo = []
+    async for row in linhas:
+        if grupo and row['funcionario_id'] != atual:
+            yield grupo
+            grupo = []
+        atual = row['funcionario_id']
+        grupo.append(row)
+    if grupo:
+        yield grupo
+
+
+def _avaliar_grupo(grupo, regras):
+    """Avalia as linhas (funcionário + ocorrências) de um funcionário"""
+    ocorrencias_raw = [row for row in grupo if row['id'] is not None]
+    return avaliar_bonus(grupo[0]['funcionario_id'], grupo[0]['nome'], ocorrencias_raw, regras)
+
+
+async def calcular_bonus_lote(data_inicio: str, data_fim: str):
+    """Versão em lista de `iterar_bonus_lote`"""
+    return [resultado async for resultado in iterar_bonus_lote(data_inicio, data_fim)]
+
+
+def dividir_periodo(data_inicio, data_fim, granularidade):
+    """Faixas (início, fim) de `granularidade` ("mes", "semana" ou "dia") que
+    cobrem o período; a primeira e a última são recortadas nas datas pedidas
+    e as semanas vão de segunda a domingo"""
+    faixas = []
+    inicio = data_inicio
+    while inicio <= data_fim:
+        if granularidade == "mes":
+            proximo = (inicio.replace(day=1) + timedelta(days=32)).replace(day=1)
+        elif granularidade == "semana":
+            proximo = inicio + timedelta(days=7 - inicio.weekday())
+        else:
+            proximo = inicio + timedelta(days=1)
+        fim = min(proximo - timedelta(days=1), data_fim)
+        faixas.append((inicio, fim))
+        inicio = proximo
+    return faixas
+
+
+async def iterar_tendencia(faixas, tamanho_lote: int = 2000):
+    """Bônus de cada funcionário ativo em cada faixa de `dividir_periodo`.
+
+    As ocorrências do período todo são lidas uma única vez, em ordem de
+    data; cada funcionário é percorrido uma vez, acumulando as ocorrências
+    da faixa corrente e avaliando-a quando a data passa do fim dela. Cada
+    faixa é avaliada como um período próprio (anulações só valem dentro da
+    faixa). Gera (funcionário, nome, [resultado por faixa]).
+    """
+    regras = (await obter_regras()).por_tipo
+
+    async with conexao() as db:
+        async for grupo in _iterar_grupos(db, faixas[0][0], faixas[-1][1], tamanho_lote):
+            funcionario_id, nome = grupo[0]['funcionario_id'], grupo[0]['nome']
+            resultados = []
+            faixa = []
+            for row in grupo:
+                if row['id'] is None:
+                    continue
+                while row['data'] > faixas[len(resultados)][1]:
+                    resultados.append(avaliar_bonus(funcionario_id, nome, faixa, regras))
+                    faixa = []
+                faixa.append(row)
+            while len(resultados) < len(faixas):
+                resultados.append(avaliar_bonus(funcionario_id, nome, faixa, regras))
+                faixa = []
+            yield funcionario_id, nome, resultados
@@ -0,0 +1,195 @@
+"""Avaliação das regras de bônus para o quadro inteiro de uma vez.
+
+As ocorrências do período viram uma matriz funcionário × tipo (quantidade e
+posição da primeira ocorrência) e as regras são aplicadas como operações de
+array. Produz os mesmos `bonus_percentual`, `recebe_bonus` e
+`bonus_positivos` de `app.bonus.avaliar_bonus`, sem os `detalhes`.
+
+O NumPy é opcional: sem ele (ex.: no executável) a mesma matriz é avaliada
+linha a linha por `aplicar_regras`.
+"""
+from typing import List, NamedTuple
+
+from app.bonus import aplicar_regras
+from app.database_async import conexao
+from app.regras import obter_regras
+
+try:
+    import numpy as np
+except ImportError:  # executável congelado ou dependência não instalada
+    np = None
+
+# Posição de um tipo que não ocorreu no período (maior que qualquer chave real)
+SEM_OCORRENCIA = 2 ** 62
+
+
+class MatrizOcorrencias(NamedTuple):
+    funcionarios: List[int]
+    nomes: List[str]
+    tipos: List[str]
+    quantidades: list   # [funcionário][tipo] -> quantidade efetiva
+    primeiras: list     # [funcionário][tipo] -> chave (data, id) da primeira ocorrência
+    anuladas: List[int]
+
+
+async def carregar_matriz(data_inicio: str, data_fim: str):
+    """Lê as ocorrências do período já agregadas por funcionário ativo e tipo efetivo"""
+    async with conexao() as db:
+        funcionarios = await db.fetchall(
+            "SELECT id, nome FROM funcionarios WHERE ativo = TRUE ORDER BY id"
+        )
+        # Mesmas regras de anulação de avaliar_bonus: só conta a anulação feita
+        # por um atestado do próprio período. A chave de ordem combina data e
+        # id em um inteiro; as linhas com tipo nulo trazem o total de anuladas.
+        linhas = await db.fetchall("""
+            WITH periodo AS (
+                SELECT o.id, o.funcionario_id, o.tipo, o.data, o.anula_ocorrencia_id
+                FROM ocorrencias o
+                JOIN funcionarios f ON f.id = o.funcionario_id AND f.ativo = TRUE
+                WHERE o.data >= %s AND o.data <= %s
+            ),
+            anuladas AS (
+                SELECT DISTINCT funcionario_id, anula_ocorrencia_id AS id
+                FROM periodo
+                WHERE anula_ocorrencia_id IS NOT NULL
+            )
+            SELECT
+                p.funcionario_id,
+                CASE WHEN p.anula_ocorrencia_id IS NOT NULL THEN 'atestado' ELSE p.tipo END AS tipo,
+                COUNT(*) AS quantidade,
+                MIN((p.data - DATE '2000-01-01')::bigint * 4294967296 + p.id) AS primeira
+            FROM periodo p
+            WHERE NOT EXISTS (
+                SELECT 1 FROM anuladas a WHERE a.id = p.id AND a.funcionario_id = p.funcionario_id
+            )
+            GROUP BY 1, 2
+            UNION ALL
+            SELECT funcionario_id, NULL, COUNT(*), NULL
+            FROM anuladas
+            GROUP BY funcionario_id
+        """, (data_inicio, data_fim))
+
+    indice = {row['id']: i for i, row in enumerate(funcionarios)}
+    tipos = sorted({row['tipo'] for row in linhas if row['tipo'] is not None})
+    coluna = {tipo: j for j, tipo in enumerate(tipos)}
+
+    quantidades = [[0] * len(tipos) for _ in funcionarios]
+    primeiras = [[SEM_OCORRENCIA] * len(tipos) for _ in funcionarios]
+    anuladas = [0] * len(funcionarios)
+    for row in linhas:
+        i = indice[row['funcionario_id']]
+        if row['tipo'] is None:
+            anuladas[i] = row['quantidade']
+        else:
+            quantidades[i][coluna[row['tipo']]] = row['quantidade']
+            primeiras[i][coluna[row['tipo']]] = row['primeira']
+
+    return MatrizOcorrencias(
+        [row['id'] for row in funcionarios],
+        [row['nome'] for row in funcionarios],
+        tipos, quantidades, primeiras, anuladas
+    )
+
+
+def contadores_funcionario(matriz, i):
+    """tipo -> quantidade de um funcionário, na ordem da primeira ocorrência"""
+    presentes = [j for j, qtd in enumerate(matriz.quantidades[i]) if qtd]
+    presentes.sort(key=lambda j: matriz.primeiras[i][j])
+    return {matriz.tipos[j]: matriz.quantidades[i][j] for j in presentes}
+
+
+def avaliar_matriz(matriz, regras):
+    """Bônus de todos os funcionários da matriz.
+
+    Retorna listas alinhadas com `matriz.funcionarios`:
+    (bonus_percentual, recebe_bonus, bonus_positivos).
+    """
+    if np is None or not matriz.funcionarios:
+        return _avaliar_matriz_python(matriz, regras)
+
+    quantidades = np.array(matriz.quantidades, dtype=np.float64).reshape(len(matriz.funcionarios), len(matriz.tipos))
+    primeiras = np.array(matriz.primeiras, dtype=np.int64).reshape(quantidades.shape)
+
+    # Vetores das regras por coluna; tipo sem regra não tem efeito
+    vazias = [regras.get(tipo) for tipo in matriz.tipos]
+    categoria = np.array([r.categoria if r else "" for r in vazias], dtype=object)
+    desconto = np.array([r.desconto if r else 0.0 for r in vazias], dtype=np.float64)
+    limite = np.array([r.limite if r and r.limite is not None else np.inf for r in vazias], dtype=np.float64)
+
+    # Onde cada funcionário perde o bônus: primeira ocorrência de um tipo que
+    # elimina, ou do atestado quando passa do limite
+    elimina = (categoria == "elimina") & (quantidades > 0)
+    elimina |= (categoria == "limite") & (np.array(matriz.tipos, dtype=object) == "atestado") & (quantidades > limite)
+    perda = np.where(elimina, primeiras, SEM_OCORRENCIA).min(axis=1, initial=SEM_OCORRENCIA)
+    perdeu = perda < SEM_OCORRENCIA
+
+    # Descontos percentuais (irrelevantes quando perde o bônus) e bônus
+    # positivos, que contam só para tipos que aparecem antes da perda
+    aplicavel = np.clip(np.minimum(quantidades, limite), 0, None)
+    antes_da_perda = primeiras < perda[:, None]
+    reducoes = np.where(categoria == "percentual", desconto * quantidades, 0.0)
+    acrescimos = np.where((categoria == "bonus") & antes_da_perda, desconto * aplicavel, 0.0)
+
+    # Acumula coluna a coluna na ordem da primeira ocorrência de cada
+    # funcionário, como aplicar_regras: somas de ponto flutuante em outra
+    # ordem podem dar resultado diferente (ex.: 0.0 contra 1e-14) e mudar
+    # o recebe_bonus. Colunas sem ocorrência somam zero.
+    ordem = np.argsort(primeiras, axis=1, kind="stable")
+    reducoes = np.take_along_axis(reducoes, ordem, axis=1)
+    acrescimos = np.take_along_axis(acrescimos, ordem, axis=1)
+    restante = np.full(len(matriz.funcionarios), 100.0)
+    positivos = np.zeros(len(matriz.funcionarios))
+    for j in range(len(matriz.tipos)):
+        restante -= reducoes[:, j]
+        positivos += acrescimos[:, j]
+
+    final = np.where(perdeu, 0.0, np.clip(restante + positivos, 0, 200))
+
+    bonus_percentual = [round(float(v), 2) for v in final]
+    return bonus_percentual, [v > 0 for v in final.tolist()], [round(float(v), 2) for v in positivos]
+
+
+def _avaliar_matriz_python(matriz, regras):
+    bonus_percentual, recebe_bonus, bonus_positivos = [], [], []
+    for i, funcionario_id in enumerate(matriz.funcionarios):
+        resultado = aplicar_regras(
+            funcionario_id, matriz.nomes[i], contadores_funcionario(matriz, i), matriz.anuladas[i], regras
+        )
+        bonus_percentual.append(resultado['bonus_percentual'])
+        recebe_bonus.append(resultado['recebe_bonus'])
+        bonus_positivos.append(resultado['bonus_positivos'])
+    return bonus_percentual, recebe_bonus, bonus_positivos
+
+
+async def simular_regras(data_inicio: str, data_fim: str, propostas):
+    """Avalia cada funcionário ativo com as regras atuais e com `propostas`.
+
+    A matriz é lida uma única vez e avaliada nas duas versões. Os `detalhes`
+    só são calculados para quem pode mudar: bônus diferente ou ocorrência de
+    um tipo cuja regra mudou; para os demais vêm como None nos dois lados.
+    Gera pares (resultado atual, resultado proposto).
+    """
+    atuais = (await obter_regras()).por_tipo
+    matriz = await carregar_matriz(data_inicio, data_fim)
+
+    bonus_atual, recebe_atual, _ = avaliar_matriz(matriz, atuais)
+    bonus_proposto, recebe_proposto, _ = avaliar_matriz(matriz, propostas)
+    colunas_alteradas = [
+        j for j, tipo in enumerate(matriz.tipos) if atuais.get(tipo) != propostas.get(tipo)
+    ]
+
+    for i, funcionario_id in enumerate(matriz.funcionarios):
+        nome = matriz.nomes[i]
+        if bonus_atual[i] != bonus_proposto[i] or any(matriz.quantidades[i][j] for j in colunas_alteradas):
+            contadores = contadores_funcionario(matriz, i)
+            yield (
+                aplicar_regras(funcionario_id, nome, contadores, matriz.anuladas[i], atuais),
+                aplicar_regras(funcionario_id, nome, contadores, matriz.anuladas[i], propostas)
+            )
+        else:
+            yield (
+                {"funcionario_id": funcionario_id, "nome": nome, "bonus_percentual": bonus_atual[i],
+                 "recebe_bonus": recebe_atual[i], "detalhes": None},
+                {"funcionario_id": funcionario_id, "nome": nome, "bonus_percentual": bonus_proposto[i],
+                 "recebe_bonus": recebe_proposto[i], "detalhes": None}
+            )
@@ -0,0 +1,100 @@
+"""Cache no processo dos cadastros de funcionários.
+
+Guarda cada funcionário lido por id (LRU, até BONIFICACAO_CACHE_FUNCIONARIOS
+entradas) e as listas de ativos e inativos. Os endpoints que gravam em
+funcionários chamam `invalidar_funcionarios` depois do commit; como nas
+regras, uma versão avança a cada invalidação e uma leitura que começou antes
+dela não grava no cache o que leu.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from app.database_async import conexao
+
+TAMANHO_CACHE = int(os.getenv("BONIFICACAO_CACHE_FUNCIONARIOS", "1024"))
+
+COLUNAS = "id, nome, funcao, ativo, data_cadastro"
+
+_lock = threading.Lock()
+_versao = 0
+_por_id = OrderedDict()
+_listas = {}                # ativo (bool) -> lista ordenada por nome
+_acertos = 0
+_falhas = 0
+
+
+def _buscar(chave, origem):
+    global _acertos, _falhas
+    with _lock:
+        valor = origem.get(chave)
+        if valor is None:
+            _falhas += 1
+            return None, _versao
+        if origem is _por_id:
+            _por_id.move_to_end(chave)
+        _acertos += 1
+        return valor, _versao
+
+
+async def obter_funcionario(funcionario_id):
+    """Cadastro do funcionário (dicionário), ou None se não existir"""
+    funcionario, versao = _buscar(funcionario_id, _por_id)
+    if funcionario is not None:
+        return funcionario
+
+    async with conexao() as db:
+        funcionario = await db.fetchone(f"SELECT {COLUNAS} FROM funcionarios WHERE id = %s", (funcionario_id,))
+
+    # Inexistentes não são guardados: o id pode ser criado por fora da API
+    if funcionario is not None and TAMANHO_CACHE > 0:
+        funcionario = dict(funcionario)
+        with _lock:
+            if versao == _versao:
+                _por_id[funcionario_id] = funcionario
+                _por_id.move_to_end(funcionario_id)
+                while len(_por_id) > TAMANHO_CACHE:
+                    _por_id.popitem(last=False)
+    return funcionario
+
+
+async def listar_funcionarios(ativo=True):
+    """Funcionários ativos (ou inativos) ordenados por nome"""
+    lista, versao = _buscar(ativo, _listas)
+    if lista is not None:
+        return list(lista)
+
+    async with conexao() as db:
+        lista = [dict(row) for row in await db.fetchall(
+            f"SELECT {COLUNAS} FROM funcionarios WHERE ativo = %s ORDER BY nome", (ativo,)
+        )]
+
+    if TAMANHO_CACHE > 0:
+        with _lock:
+            if versao == _versao:
+                _listas[ativo] = lista
+    return list(lista)
+
+
+def invalidar_funcionarios(funcionario_id=None):
+    """Descarta o funcionário (ou todos, sem id) e as listas; chamado após
+    qualquer escrita em funcionarios"""
+    global _versao
+    with _lock:
+        _versao += 1
+        if funcionario_id is None:
+            _por_id.clear()
+        else:
+            _por_id.pop(funcionario_id, None)
+        _listas.clear()
+
+
+def estatisticas_cache():
+    with _lock:
+        return {
+            "entradas": len(_por_id),
+            "listas": len(_listas),
+            "maximo": TAMANHO_CACHE,
+            "acertos": _acertos,
+            "falhas": _falhas,
+        }
@@ -0,0 +1,129 @@
+"""Cache das respostas de relatório (bônus por funcionário e relatório geral).
+
+A chave é a consulta (rota e parâmetros) mais a versão das regras e a marca
+d'água de alterações do banco (soma de `marcas_dados`, avançada por
+triggers), então uma entrada nunca sobrevive a uma alteração: passa a ser
+inalcançável e sai pelo LRU. A marca é lida antes dos dados; se mudar no
+meio do cálculo, a entrada fica com a marca antiga e é apenas recalculada
+na próxima consulta.
+
+Cada entrada guarda o corpo JSON pronto e um ETag forte derivado dele.
+
+Requisições simultâneas com a mesma chave que não acharam a entrada
+compartilham um único cálculo (`calcular_unico`): a primeira dispara o
+cálculo e as demais aguardam o mesmo resultado (ou o mesmo erro).
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from app.database_async import conexao
+from app.regras import versao_regras
+
+TAMANHO_CACHE = int(os.getenv("BONIFICACAO_CACHE_RELATORIOS", "128"))
+
+_lock = threading.Lock()
+_entradas = OrderedDict()
+_acertos = 0
+_falhas = 0
+_em_andamento = {}          # chave -> task do cálculo em curso
+_agrupadas = 0
+
+
+async def marca_dados(db):
+    row = await db.fetchone("SELECT COALESCE(SUM(versao), 0)::bigint AS versao FROM marcas_dados")
+    return row['versao']
+
+
+async def compactar_marcas():
+    """Soma na linha 0 as linhas de conexões do banco já encerradas.
+
+    Cada conexão ganha uma linha em `marcas_dados` e o pool troca conexões
+    com o tempo; sem isso a tabela (somada a cada consulta) só cresceria.
+    Retorna quantas linhas foram removidas (ver a migração 12).
+    """
+    async with conexao() as db:
+        row = await db.fetchone("SELECT compactar_marcas_dados() AS linhas")
+        await db.commit()
+    return row['linhas']
+
+
+def chave_relatorio(marca, *consulta):
+    return (*consulta, versao_regras(), marca)
+
+
+def buscar(chave):
+    """(corpo, etag) da entrada, ou None; marca a entrada como recém-usada"""
+    global _acertos, _falhas
+    with _lock:
+        entrada = _entradas.get(chave)
+        if entrada is None:
+            _falhas += 1
+            return None
+        _entradas.move_to_end(chave)
+        _acertos += 1
+        return entrada
+
+
+def armazenar(chave, conteudo):
+    """Serializa `conteudo`, guarda no cache e retorna (corpo, etag)"""
+    corpo = JSONResponse(content=jsonable_encoder(conteudo)).body
+    entrada = (corpo, '"' + hashlib.sha256(corpo).hexdigest()[:32] + '"')
+    if TAMANHO_CACHE > 0:
+        with _lock:
+            _entradas[chave] = entrada
+            _entradas.move_to_end(chave)
+            while len(_entradas) > TAMANHO_CACHE:
+                _entradas.popitem(last=False)
+    return entrada
+
+
+async def calcular_unico(chave, calcular):
+    """(corpo, etag) de `await calcular()`, com um único cálculo por chave em curso.
+
+    O cálculo roda em uma task própria: se a requisição que o disparou for
+    cancelada (cliente desconectou), as que estão aguardando não são.
+    """
+    global _agrupadas
+    tarefa = _em_andamento.get(chave)
+    if tarefa is None:
+        tarefa = asyncio.create_task(_calcular_e_armazenar(chave, calcular))
+        _em_andamento[chave] = tarefa
+    else:
+        with _lock:
+            _agrupadas += 1
+    return await asyncio.shield(tarefa)
+
+
+async def _calcular_e_armazenar(chave, calcular):
+    try:
+        return armazenar(chave, await calcular())
+    finally:
+        _em_andamento.pop(chave, None)
+
+
+def responder(request, entrada):
+    """Resposta com ETag; 304 sem corpo se o cliente já tem esta versão"""
+    corpo, etag = entrada
+    cabecalhos = {"ETag": etag, "Cache-Control": "no-cache"}
+    enviados = request.headers.get("if-none-match", "")
+    if etag in [e.strip() for e in enviados.split(",")] or enviados.strip() == "*":
+        return Response(status_code=304, headers=cabecalhos)
+    return Response(content=corpo, media_type="application/json", headers=cabecalhos)
+
+
+def estatisticas_cache():
+    with _lock:
+        return {
+            "entradas": len(_entradas),
+            "maximo": TAMANHO_CACHE,
+            "acertos": _acertos,
+            "falhas": _falhas,
+            "em_andamento": len(_em_andamento),
+            "agrupadas": _agrupadas,
+        }
@@ -0,0 +1,224 @@
+"""Contadores do dashboard mantidos no processo.
+
+Funcionários ativos e ocorrências do mês atual por tipo ficam em memória:
+carregados do banco na primeira consulta (e na virada do mês), atualizados
+pelos endpoints que gravam ocorrências e funcionários e reconciliados com o
+banco periodicamente, o que corrige qualquer escrita feita por fora da API.
+
+Quem grava usa `alteracao()` em volta da transação e informa o que mudou
+depois do commit:
+
+    async with contadores_dashboard.alteracao() as alteracao, conexao() as db:
+        ...
+        await db.commit()
+        alteracao.ocorrencias_incluidas([(tipo, data)])
+
+Enquanto houver gravação em andamento uma recarga não é aceita, para que
+uma escrita nunca seja contada duas vezes (no retrato e no delta).
+"""
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from datetime import date
+
+from app import cache_relatorios
+from app.database_async import conexao
+
+INTERVALO_RECONCILIACAO = float(os.getenv("BONIFICACAO_DASHBOARD_RECONCILIAR", "300"))
+TENTATIVAS_RECARGA = 5
+
+_lock = threading.Lock()
+_mes = None                 # primeiro dia do mês dos contadores; None = não carregado
+_funcionarios_ativos = 0
+_por_tipo = {}
+_pendentes = 0              # gravações dentro de alteracao()
+_geracao = 0                # avança a cada gravação concluída
+_recarregar = False
+_assinantes = set()         # asyncio.Event de cada stream de eventos aberto
+_recarga = asyncio.Lock()
+
+
+class Alteracao:
+    """Deltas de uma gravação, aplicados ao sair de `alteracao()`"""
+
+    def __init__(self):
+        self.funcionarios = 0
+        self.ocorrencias = []
+
+    def funcionarios_ativos(self, delta):
+        self.funcionarios += delta
+
+    def ocorrencias_incluidas(self, linhas):
+        self.ocorrencias.extend((tipo, data, 1) for tipo, data in linhas)
+
+    def ocorrencias_excluidas(self, linhas):
+        self.ocorrencias.extend((tipo, data, -1) for tipo, data in linhas)
+
+
+@asynccontextmanager
+async def alteracao():
+    global _pendentes, _geracao
+    with _lock:
+        _pendentes += 1
+    registro = Alteracao()
+    try:
+        yield registro
+    finally:
+        with _lock:
+            _pendentes -= 1
+            _geracao += 1
+            if _mes is not None:
+                _aplicar(registro)
+        if registro.funcionarios or registro.ocorrencias:
+            _notificar()
+
+
+def _aplicar(registro):
+    global _funcionarios_ativos
+    _funcionarios_ativos += registro.funcionarios
+    for tipo, data, delta in registro.ocorrencias:
+        if data >= _mes:
+            qtd = _por_tipo.get(tipo, 0) + delta
+            if qtd:
+                _por_tipo[tipo] = qtd
+            else:
+                _por_tipo.pop(tipo, None)
+
+
+async def _ler_banco(mes):
+    async with conexao() as db:
+        ativos = (await db.fetchone("SELECT COUNT(*) AS total FROM funcionarios WHERE ativo = TRUE"))['total']
+        por_tipo = await db.fetchall(
+            "SELECT tipo, COUNT(*) AS qtd FROM ocorrencias WHERE data >= %s GROUP BY tipo", (mes,)
+        )
+    return ativos, {row['tipo']: row['qtd'] for row in por_tipo}
+
+
+async def recarregar():
+    """Substitui os contadores pelos valores do banco.
+
+    Retorna True se o retrato divergia dos contadores em memória.
+    """
+    global _mes, _funcionarios_ativos, _por_tipo, _recarregar
+    mes = date.today().replace(day=1)
+    for tentativa in range(TENTATIVAS_RECARGA):
+        with _lock:
+            geracao, pendentes = _geracao, _pendentes
+        ativos, por_tipo = await _ler_banco(mes)
+        with _lock:
+            estavel = pendentes == 0 and _pendentes == 0 and _geracao == geracao
+            # Sob escrita contínua, aceita o retrato e tenta de novo na próxima leitura
+            aceito = estavel or tentativa == TENTATIVAS_RECARGA - 1
+            if aceito:
+                anterior = (_mes, _funcionarios_ativos, _por_tipo)
+                _mes, _funcionarios_ativos, _por_tipo = mes, ativos, por_tipo
+                _recarregar = not estavel
+        if aceito:
+            if anterior != (mes, ativos, por_tipo):
+                _notificar()
+            return anterior[0] == mes and anterior[1:] != (ativos, por_tipo)
+        await asyncio.sleep(0.05 * (tentativa + 1))
+
+
+def invalidar():
+    """Marca os contadores para recarga (alteração feita por outro processo)"""
+    global _geracao, _recarregar
+    with _lock:
+        if _mes is None:
+            return
+        # Avançar a geração também descarta uma recarga já em andamento
+        _geracao += 1
+        _recarregar = True
+    _notificar()
+
+
+def _desatualizado():
+    return _mes != date.today().replace(day=1) or _recarregar
+
+
+async def resumo():
+    """Números do dashboard, sem consultar o banco quando os contadores valem"""
+    if _desatualizado():
+        # Vários streams acordados pelo mesmo aviso fazem uma única recarga
+        async with _recarga:
+            if _desatualizado():
+                await recarregar()
+    return _resumo_atual()
+
+
+def _resumo_atual():
+    with _lock:
+        por_tipo = sorted(_por_tipo.items(), key=lambda item: (-item[1], item[0]))
+        return {
+            "total_funcionarios": _funcionarios_ativos,
+            "ocorrencias_mes_atual": sum(_por_tipo.values()),
+            "ocorrencias_por_tipo": [{"tipo": tipo, "qtd": qtd} for tipo, qtd in por_tipo]
+        }
+
+
+def _notificar():
+    for evento in list(_assinantes):
+        evento.set()
+
+
+async def assinar(intervalo_verificacao=15.0):
+    """Gera o resumo completo e depois só os campos que mudaram.
+
+    Cada assinante é apenas acordado a cada alteração; várias alterações
+    seguidas viram um único envio com o estado mais recente. Gera None a
+    cada `intervalo_verificacao` segundos sem mudança (para manter a conexão
+    viva); a virada do mês é verificada nesse momento.
+    """
+    evento = asyncio.Event()
+    _assinantes.add(evento)
+    try:
+        enviado = await resumo()
+        yield enviado
+        while True:
+            try:
+                await asyncio.wait_for(evento.wait(), intervalo_verificacao)
+            except asyncio.TimeoutError:
+                ocioso = True
+                atual = await resumo()
+            else:
+                ocioso = False
+                evento.clear()
+                atual = await resumo()
+            delta = {chave: valor for chave, valor in atual.items() if enviado.get(chave) != valor}
+            enviado = atual
+            if delta or ocioso:
+                yield delta or None
+    finally:
+        _assinantes.discard(evento)
+
+
+async def _reconciliar_periodicamente():
+    while True:
+        await asyncio.sleep(INTERVALO_RECONCILIACAO)
+        try:
+            if _mes is not None and await recarregar():
+                print("🔧 Contadores do dashboard corrigidos na reconciliação")
+        except Exception as e:
+            print(f"⚠️ Falha na reconciliação do dashboard: {e}")
+        # Mesma manutenção periódica: linhas da marca d'água de conexões encerradas
+        try:
+            await cache_relatorios.compactar_marcas()
+        except Exception as e:
+            print(f"⚠️ Falha ao compactar a marca d'água dos relatórios: {e}")
+
+
+_tarefa = None
+
+
+async def iniciar_reconciliacao():
+    global _tarefa
+    if _tarefa is None and INTERVALO_RECONCILIACAO > 0:
+        _tarefa = asyncio.create_task(_reconciliar_periodicamente())
+
+
+async def parar_reconciliacao():
+    global _tarefa
+    if _tarefa is not None:
+        _tarefa.cancel()
+        _tarefa = None
@@ -1,126 +1,303 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from app.migracoes import aplicar_migracoes
 import os
+import threading
+import time
+import uuid
+
+# Configuração do PostgreSQL LOCAL (pode ser sobrescrita por variáveis de ambiente)
+DB_CONFIG = {
+    "host": os.getenv("BONIFICACAO_DB_HOST", "localhost"),
+    "database": os.getenv("BONIFICACAO_DB_NAME", "bonificacao"),
+    "user": os.getenv("BONIFICACAO_DB_USER", "Seu usuario do DB"),
+    "password": os.getenv("BONIFICACAO_DB_PASSWORD", "Sua senha do DB"),
+    "port": os.getenv("BONIFICACAO_DB_PORT", "5432"),
+}
+
+# Configuração do pool de conexões
+POOL_MIN = int(os.getenv("BONIFICACAO_POOL_MIN", "2"))
+POOL_MAX = int(os.getenv("BONIFICACAO_POOL_MAX", "20"))
+POOL_TIMEOUT = float(os.getenv("BONIFICACAO_POOL_TIMEOUT", "10"))
+# Conexões ociosas há mais tempo que isso são testadas com SELECT 1 antes do uso
+POOL_VERIFICAR_APOS = float(os.getenv("BONIFICACAO_POOL_VERIFICAR_APOS", "30"))
+
+
+_origem = (None, None)
+
+
+def origem_processo():
+    """Nome (application_name) das conexões deste processo.
+
+    Os avisos de alteração do banco trazem esse nome, para que cada processo
+    do servidor ignore os avisos das próprias gravações.
+    """
+    global _origem
+    pid, nome = _origem
+    if pid != os.getpid():
+        nome = f"bonificacao-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        _origem = (os.getpid(), nome)
+    return nome
+
+
+def conectar():
+    """Abre uma conexão avulsa, fora do pool"""
+    return psycopg2.connect(cursor_factory=RealDictCursor, application_name=origem_processo(), **DB_CONFIG)
+
+
+class PoolEsgotado(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo limite"""
+
+
+class ConexaoPool:
+    """Conexão emprestada do pool.
+
+    Repassa tudo para a conexão psycopg2 real; `close()` devolve a conexão
+    ao pool em vez de fechá-la, então os routers continuam usando o mesmo
+    padrão `conn = get_db_connection() ... conn.close()`.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, nome):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("conexão já devolvida ao pool")
+        return getattr(self._conn, nome)
+
+    def __setattr__(self, nome, valor):
+        # Atributos como autocommit pertencem à conexão real
+        if nome.startswith("_"):
+            object.__setattr__(self, nome, valor)
+        else:
+            setattr(self._conn, nome, valor)
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.devolver(conn)
+
+    def __del__(self):
+        # Garante a devolução quando um router esquece o close() em caso de erro
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class PoolConexoes:
+    """Pool de conexões PostgreSQL compartilhado pelo processo"""
+
+    def __init__(self, minimo=POOL_MIN, maximo=POOL_MAX, timeout=POOL_TIMEOUT,
+                 verificar_apos=POOL_VERIFICAR_APOS):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError("Tamanho de pool inválido")
+
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.verificar_apos = verificar_apos
+
+        self._cond = threading.Condition()
+        self._ociosas = []  # pilha de (conexão, instante em que foi devolvida)
+        self._total = 0
+        self._em_uso = 0
+        self._fechado = False
+
+        # Métricas
+        self._checkouts = 0
+        self._falhas_checkout = 0
+        self._descartadas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+        for _ in range(minimo):
+            self._ociosas.append((self._abrir(), time.monotonic()))
+            self._total += 1
+
+    def _abrir(self):
+        return conectar()
+
+    def _saudavel(self, conn, devolvida_em):
+        if conn.closed:
+            return False
+        if time.monotonic() - devolvida_em < self.verificar_apos:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def obter(self, timeout=None):
+        """Empresta uma conexão, aguardando até `timeout` segundos"""
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        limite = inicio + timeout
+
+        while True:
+            conn = None
+            criar = False
+
+            with self._cond:
+                while True:
+                    if self._fechado:
+                        raise PoolEsgotado("Pool de conexões encerrado")
+                    if self._ociosas:
+                        conn, devolvida_em = self._ociosas.pop()
+                        break
+                    if self._total < self.maximo:
+                        # Reserva a vaga antes de conectar fora do lock
+                        self._total += 1
+                        criar = True
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._falhas_checkout += 1
+                        raise PoolEsgotado(
+                            f"Nenhuma conexão disponível em {timeout}s "
+                            f"({self._em_uso} em uso, máximo {self.maximo})"
+                        )
+                    self._cond.wait(restante)
+
+            if criar:
+                try:
+                    conn = self._abrir()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._falhas_checkout += 1
+                        self._cond.notify()
+                    raise
+            elif not self._saudavel(conn, devolvida_em):
+                self._descartar(conn)
+                with self._cond:
+                    self._total -= 1
+                    self._descartadas += 1
+                continue
+
+            espera = time.monotonic() - inicio
+            with self._cond:
+                self._em_uso += 1
+                self._checkouts += 1
+                self._espera_total += espera
+                self._espera_max = max(self._espera_max, espera)
+
+            return ConexaoPool(self, conn)
+
+    def devolver(self, conn):
+        """Recebe a conexão de volta, descartando-a se estiver quebrada"""
+        reutilizavel = not conn.closed and not self._fechado
+        if reutilizavel:
+            try:
+                status = conn.info.transaction_status
+                if status == TRANSACTION_STATUS_UNKNOWN:
+                    reutilizavel = False
+                elif status != TRANSACTION_STATUS_IDLE:
+                    # Transação esquecida aberta (ex.: exceção antes do commit)
+                    conn.rollback()
+                if reutilizavel and conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                reutilizavel = False
+
+        if not reutilizavel:
+            self._descartar(conn)
+
+        with self._cond:
+            self._em_uso -= 1
+            if reutilizavel:
+                self._ociosas.append((conn, time.monotonic()))
+            else:
+                self._total -= 1
+                self._descartadas += 1
+            self._cond.notify()
+
+    def fechar(self):
+        """Fecha as conexões ociosas e recusa novos empréstimos"""
+        with self._cond:
+            self._fechado = True
+            ociosas, self._ociosas = self._ociosas, []
+            self._total -= len(ociosas)
+            self._cond.notify_all()
+        for conn, _ in ociosas:
+            self._descartar(conn)
+
+    def estatisticas(self):
+        with self._cond:
+            return {
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "total": self._total,
+                "em_uso": self._em_uso,
+                "ociosas": len(self._ociosas),
+                "checkouts": self._checkouts,
+                "falhas_checkout": self._falhas_checkout,
+                "descartadas": self._descartadas,
+                "espera_total_ms": round(self._espera_total * 1000, 2),
+                "espera_media_ms": round(self._espera_total * 1000 / self._checkouts, 2) if self._checkouts else 0.0,
+                "espera_max_ms": round(self._espera_max * 1000, 2),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retorna o pool do processo, criando-o no primeiro uso"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolConexoes()
+    return _pool
+
 
 def get_db_connection():
-    """Conexão com PostgreSQL LOCAL"""
-    conn = psycopg2.connect(
-        host="localhost",
-        database="bonificacao",
-        user="Seu usuario do DB",
-        password="Sua senha do DB",
-        port="5432",
-        cursor_factory=RealDictCursor
-    )
-    return conn
+    """Conexão com PostgreSQL LOCAL emprestada do pool"""
+    return get_pool().obter()
+
+
+def fechar_pool():
+    """Encerra o pool (chamado no shutdown da aplicação)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.fechar()
+            _pool = None
+
+
+def estatisticas_pool():
+    """Métricas do pool de conexões"""
+    return get_pool().estatisticas()
 
 def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # --- Criar tabela funcionarios se não existir ---
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS funcionarios (
-            id SERIAL PRIMARY KEY,
-            nome TEXT NOT NULL,
-            funcao TEXT NOT NULL,
-            ativo BOOLEAN DEFAULT TRUE,
-            data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # Garantir coluna funcao existe
-    cursor.execute("""
-        ALTER TABLE funcionarios
-        ADD COLUMN IF NOT EXISTS funcao TEXT;
-    """)
-
-    # Garantir coluna ativo
-    cursor.execute("""
-        ALTER TABLE funcionarios
-        ADD COLUMN IF NOT EXISTS ativo BOOLEAN DEFAULT TRUE;
-    """)
-
-    # Garantir coluna data_cadastro
-    cursor.execute("""
-        ALTER TABLE funcionarios
-        ADD COLUMN IF NOT EXISTS data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
-    """)
-
-    # Adicionar constraint CHECK se não existir (PostgreSQL não tem "IF NOT EXISTS" para CHECK)
-    cursor.execute("""
-        DO $$
-        BEGIN
-            IF NOT EXISTS (
-                SELECT 1 FROM pg_constraint WHERE conname = 'funcionarios_funcao_check'
-            ) THEN
-                ALTER TABLE funcionarios
-                ADD CONSTRAINT funcionarios_funcao_check
-                CHECK (funcao IN ('LIDER','OPERADOR','AJUDANTE'));
-            END IF;
-        END;
-        $$;
-    """)
-
-    # --------------------------
-    # OCORRENCIAS
-    # --------------------------
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS ocorrencias (
-            id SERIAL PRIMARY KEY,
-            funcionario_id INTEGER NOT NULL REFERENCES funcionarios(id),
-            tipo TEXT NOT NULL,
-            data DATE NOT NULL,
-            observacao TEXT,
-            anula_ocorrencia_id INTEGER,
-            registrado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    cursor.execute("""
-        ALTER TABLE ocorrencias
-        ADD COLUMN IF NOT EXISTS registrado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
-    """)
-
-    # --------------------------
-    # REGRAS BONUS
-    # --------------------------
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS regras_bonus (
-            id SERIAL PRIMARY KEY,
-            tipo TEXT UNIQUE NOT NULL,
-            categoria TEXT NOT NULL,
-            desconto REAL NOT NULL,
-            limite INTEGER,
-            descricao TEXT
-        )
-    """)
-
-    # Inserir regras padrão caso não existam
-    regras_padrao = [
-        ('falta','elimina',100,None,'Perde todo o bônus'),
-        ('atestado','limite',100,2,'Mais de 2 atestados perde o bônus'),
-        ('advertencia','elimina',100,None,'Perde todo o bônus'),
-        ('suspensao','elimina',100,None,'Perde todo o bônus'),
-        ('atraso','elimina',100,None,'Perde todo o bônus'),
-        ('saida_antecipada','elimina',100,None,'Perde todo o bônus'),
-        ('reclamacao_qualidade','percentual',10,None,'Reduz 10% do bônus'),
-        ('esqueceu_ponto','percentual',10,None,'Reduz 10% do bônus'),
-        ('avaria_menor','percentual',10,None,'Reduz 10% do bônus'),
-        ('avaria_grave','percentual',20,None,'Reduz 20% do bônus'),
-        ('supermeta_110','bonus',10,1,'Bônus de 10% por supermeta 110%'),
-        ('supermeta_120','bonus',20,1,'Bônus de 20% por supermeta 120%')
-    ]
-
-    for regra in regras_padrao:
-        cursor.execute("""
-            INSERT INTO regras_bonus(tipo, categoria, desconto, limite, descricao)
-            VALUES (%s,%s,%s,%s,%s)
-            ON CONFLICT (tipo) DO NOTHING
-        """, regra)
-
-    conn.commit()
-    conn.close()
-    print("✅ Banco atualizado e sincronizado automaticamente!")
+    """Aplica as migrações de esquema pendentes"""
+    # Conexão avulsa: o pool só é criado se o backend síncrono for usado
+    conn = conectar()
+
+    try:
+        aplicadas = aplicar_migracoes(conn)
+    finally:
+        conn.close()
+
+    if aplicadas:
+        print(f"✅ Banco atualizado (migrações aplicadas: {', '.join(map(str, aplicadas))})")
+    else:
+        print("✅ Banco já está atualizado")
@@ -0,0 +1,353 @@
+"""Acesso assíncrono ao PostgreSQL usado pelos routers.
+
+Com o psycopg 3 instalado, as consultas rodam em um AsyncConnectionPool sem
+ocupar threads. No executável congelado (ou sem o psycopg 3) o mesmo
+código dos routers roda sobre o pool psycopg2 de `app.database`, com cada
+chamada ao banco executada no threadpool.
+
+Uso:
+
+    async with conexao() as db:
+        row = await db.fetchone("SELECT ... WHERE id = %s", (id,))
+        await db.execute("UPDATE ...", (...))
+        await db.commit()
+
+Transações não confirmadas são desfeitas ao sair do bloco.
+"""
+import asyncio
+import io
+import itertools
+import os
+import sys
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from starlette.concurrency import run_in_threadpool
+
+from app import database
+from app.database import DB_CONFIG, POOL_MIN, POOL_MAX, POOL_TIMEOUT, POOL_VERIFICAR_APOS, PoolEsgotado
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool, PoolTimeout
+except ImportError:  # executável congelado ou dependência não instalada
+    psycopg = None
+
+
+# Cada stream usa um cursor com nome próprio: um consumidor que para no meio
+# (break em async for) só fecha o gerador mais tarde, e o cursor anterior
+# ainda existe no servidor quando o próximo stream da conexão é aberto
+_cursores = itertools.count(1)
+
+
+def _nome_cursor():
+    return f"stream_consulta_{next(_cursores)}"
+
+
+class ErroBanco(Exception):
+    """Erro do PostgreSQL, independente do driver"""
+
+    def __init__(self, mensagem, sqlstate=None, constraint=None):
+        super().__init__(mensagem)
+        self.sqlstate = sqlstate
+        self.constraint = constraint
+
+
+def _modo_padrao():
+    modo = os.getenv("BONIFICACAO_DB_MODO")
+    if modo in ("async", "sync"):
+        return modo
+    if getattr(sys, 'frozen', False) or psycopg is None:
+        return "sync"
+    return "async"
+
+
+# --------------------------
+# BACKEND ASSÍNCRONO (psycopg 3)
+# --------------------------
+
+class _ConexaoPsycopg:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def _erro(self, e):
+        diag = getattr(e, "diag", None)
+        return ErroBanco(str(e), e.sqlstate, diag.constraint_name if diag else None)
+
+    async def execute(self, sql, params=None):
+        try:
+            async with self._conn.cursor() as cursor:
+                await cursor.execute(sql, params)
+                return cursor.rowcount
+        except psycopg.Error as e:
+            raise self._erro(e) from e
+
+    async def fetchone(self, sql, params=None):
+        try:
+            async with self._conn.cursor() as cursor:
+                await cursor.execute(sql, params)
+                return await cursor.fetchone()
+        except psycopg.Error as e:
+            raise self._erro(e) from e
+
+    async def fetchall(self, sql, params=None):
+        try:
+            async with self._conn.cursor() as cursor:
+                await cursor.execute(sql, params)
+                return await cursor.fetchall()
+        except psycopg.Error as e:
+            raise self._erro(e) from e
+
+    async def stream(self, sql, params=None, tamanho=2000):
+        """Itera o resultado por um cursor no servidor, `tamanho` linhas por vez"""
+        try:
+            async with self._conn.cursor(name=_nome_cursor()) as cursor:
+                cursor.itersize = tamanho
+                await cursor.execute(sql, params)
+                async for row in cursor:
+                    yield row
+        except psycopg.Error as e:
+            raise self._erro(e) from e
+
+    async def copiar(self, tabela, colunas, linhas):
+        """Carrega `linhas` (tuplas) em `tabela` via COPY FROM STDIN"""
+        try:
+            async with self._conn.cursor() as cursor:
+                async with cursor.copy(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN") as copy:
+                    for linha in linhas:
+                        await copy.write_row(linha)
+                return cursor.rowcount
+        except psycopg.Error as e:
+            raise self._erro(e) from e
+
+    async def commit(self):
+        await self._conn.commit()
+
+    async def rollback(self):
+        await self._conn.rollback()
+
+
+class _BancoPsycopg:
+    def __init__(self):
+        self._devolvidas_em = weakref.WeakKeyDictionary()
+        self._pool = AsyncConnectionPool(
+            kwargs={
+                "host": DB_CONFIG["host"],
+                "dbname": DB_CONFIG["database"],
+                "user": DB_CONFIG["user"],
+                "password": DB_CONFIG["password"],
+                "port": DB_CONFIG["port"],
+                "application_name": database.origem_processo(),
+                "row_factory": dict_row,
+            },
+            min_size=POOL_MIN,
+            max_size=POOL_MAX,
+            timeout=POOL_TIMEOUT,
+            check=self._verificar,
+            open=False,
+        )
+        self._aberto = False
+        self._lock = asyncio.Lock()
+
+    async def _verificar(self, conn):
+        # Mesmo critério do pool síncrono: só testa conexões ociosas há muito tempo
+        devolvida_em = self._devolvidas_em.get(conn)
+        if devolvida_em is None or time.monotonic() - devolvida_em >= POOL_VERIFICAR_APOS:
+            await AsyncConnectionPool.check_connection(conn)
+
+    async def abrir(self):
+        if not self._aberto:
+            async with self._lock:
+                if not self._aberto:
+                    await self._pool.open()
+                    self._aberto = True
+
+    async def fechar(self):
+        if self._aberto:
+            await self._pool.close()
+            self._aberto = False
+
+    @asynccontextmanager
+    async def conexao(self):
+        await self.abrir()
+        try:
+            conn = await self._pool.getconn()
+        except PoolTimeout as e:
+            # Mesmo erro do pool síncrono, para a API tratar os dois iguais
+            raise PoolEsgotado(str(e)) from e
+        try:
+            yield _ConexaoPsycopg(conn)
+        finally:
+            try:
+                if conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+                    await conn.rollback()
+            except psycopg.Error:
+                pass
+            self._devolvidas_em[conn] = time.monotonic()
+            await self._pool.putconn(conn)
+
+    def estatisticas(self):
+        stats = self._pool.get_stats()
+        tamanho = stats.get("pool_size", 0)
+        ociosas = stats.get("pool_available", 0)
+        checkouts = stats.get("requests_num", 0)
+        espera = stats.get("requests_wait_ms", 0)
+        return {
+            "driver": "psycopg3 (async)",
+            "minimo": stats.get("pool_min", POOL_MIN),
+            "maximo": stats.get("pool_max", POOL_MAX),
+            "total": tamanho,
+            "em_uso": tamanho - ociosas,
+            "ociosas": ociosas,
+            "aguardando": stats.get("requests_waiting", 0),
+            "checkouts": checkouts,
+            "falhas_checkout": stats.get("requests_errors", 0),
+            "espera_total_ms": espera,
+            "espera_media_ms": round(espera / checkouts, 2) if checkouts else 0.0,
+        }
+
+
+# --------------------------
+# BACKEND SÍNCRONO (psycopg2 no threadpool)
+# --------------------------
+
+def _valor_copy(valor):
+    """Formata um valor para o formato texto do COPY"""
+    if valor is None:
+        return "\\N"
+    texto = valor.isoformat() if hasattr(valor, "isoformat") else str(valor)
+    return (texto.replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class _ConexaoSync:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def _executar(self, sql, params, modo):
+        try:
+            with self._conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(sql, params)
+                if modo == "one":
+                    return cursor.fetchone()
+                if modo == "all":
+                    return cursor.fetchall()
+                return cursor.rowcount
+        except psycopg2.Error as e:
+            raise ErroBanco(str(e), e.pgcode, e.diag.constraint_name) from e
+
+    async def execute(self, sql, params=None):
+        return await run_in_threadpool(self._executar, sql, params, "rowcount")
+
+    async def fetchone(self, sql, params=None):
+        return await run_in_threadpool(self._executar, sql, params, "one")
+
+    async def fetchall(self, sql, params=None):
+        return await run_in_threadpool(self._executar, sql, params, "all")
+
+    async def stream(self, sql, params=None, tamanho=2000):
+        """Itera o resultado por um cursor no servidor, `tamanho` linhas por vez"""
+        cursor = self._conn.cursor(name=_nome_cursor(), cursor_factory=RealDictCursor)
+        try:
+            await run_in_threadpool(cursor.execute, sql, params)
+            while True:
+                rows = await run_in_threadpool(cursor.fetchmany, tamanho)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        except psycopg2.Error as e:
+            raise ErroBanco(str(e), e.pgcode, e.diag.constraint_name) from e
+        finally:
+            # Fecha o cursor no servidor também quando o consumidor para no
+            # meio (ex.: cliente desconectado), para a conexão poder abrir outro
+            await run_in_threadpool(self._fechar_cursor, cursor)
+
+    @staticmethod
+    def _fechar_cursor(cursor):
+        try:
+            cursor.close()
+        except psycopg2.Error:
+            # Transação já com erro: o cursor some com o rollback
+            pass
+
+    def _copiar(self, tabela, colunas, linhas):
+        buffer = io.StringIO()
+        for linha in linhas:
+            buffer.write("\t".join(_valor_copy(valor) for valor in linha) + "\n")
+        buffer.seek(0)
+        try:
+            with self._conn.cursor() as cursor:
+                cursor.copy_expert(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN", buffer)
+                return cursor.rowcount
+        except psycopg2.Error as e:
+            raise ErroBanco(str(e), e.pgcode, e.diag.constraint_name) from e
+
+    async def copiar(self, tabela, colunas, linhas):
+        """Carrega `linhas` (tuplas) em `tabela` via COPY FROM STDIN"""
+        return await run_in_threadpool(self._copiar, tabela, colunas, linhas)
+
+    async def commit(self):
+        await run_in_threadpool(self._conn.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self._conn.rollback)
+
+
+class _BancoSync:
+    async def abrir(self):
+        await run_in_threadpool(database.get_pool)
+
+    async def fechar(self):
+        await run_in_threadpool(database.fechar_pool)
+
+    @asynccontextmanager
+    async def conexao(self):
+        conn = await run_in_threadpool(database.get_db_connection)
+        try:
+            yield _ConexaoSync(conn)
+        finally:
+            # close() devolve ao pool desfazendo a transação pendente
+            await run_in_threadpool(conn.close)
+
+    def estatisticas(self):
+        return {"driver": "psycopg2 (sync)", **database.estatisticas_pool()}
+
+
+_banco = None
+
+
+def _obter_banco():
+    global _banco
+    if _banco is None:
+        _banco = _BancoPsycopg() if _modo_padrao() == "async" else _BancoSync()
+    return _banco
+
+
+def usar_modo(modo):
+    """Força o backend ("async" ou "sync"); usar antes da primeira conexão"""
+    global _banco
+    _banco = _BancoPsycopg() if modo == "async" else _BancoSync()
+
+
+def conexao():
+    """Empresta uma conexão do backend ativo (async context manager)"""
+    return _obter_banco().conexao()
+
+
+async def abrir_banco():
+    await _obter_banco().abrir()
+
+
+async def fechar_banco():
+    if _banco is not None:
+        await _banco.fechar()
+
+
+def estatisticas_banco():
+    """Métricas do pool do backend ativo"""
+    return _obter_banco().estatisticas()
@@ -0,0 +1,65 @@
+import json
+
+from app.bonus import iterar_bonus_lote
+from app.database_async import conexao
+from app.regras import carregar_regras
+
+# Colunas de bonus_fechados, na ordem do dicionário de avaliar_bonus
+COLUNAS_FECHAMENTO = [
+    "funcionario_id", "nome", "bonus_percentual", "recebe_bonus", "total_ocorrencias",
+    "atestados", "detalhes", "ocorrencias_anuladas", "bonus_positivos"
+]
+
+
+async def buscar_fechamento(db, data_inicio, data_fim):
+    """Fechamento do período exato (data_inicio, data_fim), ou None"""
+    return await db.fetchone("""
+        SELECT
+            p.id,
+            p.fechado_em,
+            p.recalculado_em,
+            (SELECT COUNT(*) FROM alteracoes_pos_fechamento a WHERE a.periodo_id = p.id) AS alteracoes_pendentes
+        FROM periodos_fechados p
+        WHERE p.data_inicio = %s AND p.data_fim = %s
+    """, (data_inicio, data_fim))
+
+
+async def gravar_fechamento(db, periodo_id, data_inicio, data_fim):
+    """Calcula o bônus de todos os funcionários ativos e congela o resultado.
+
+    Roda na transação de `db`, com as escritas em ocorrências bloqueadas, para
+    que nenhuma alteração fique de fora do cálculo e do registro de alterações.
+    As regras usadas são lidas na mesma transação e gravadas com o período.
+    Retorna (total de funcionários, quantos recebem bônus).
+    """
+    await db.execute("LOCK TABLE ocorrencias IN SHARE MODE")
+    regras = await carregar_regras(db)
+    resultados = [r async for r in iterar_bonus_lote(data_inicio, data_fim, db=db, regras=regras)]
+
+    await db.execute("UPDATE periodos_fechados SET regras = %s WHERE id = %s", (
+        json.dumps({tipo: regra._asdict() for tipo, regra in regras.items()}, ensure_ascii=False),
+        periodo_id
+    ))
+
+    await db.execute("DELETE FROM bonus_fechados WHERE periodo_id = %s", (periodo_id,))
+    await db.execute("DELETE FROM alteracoes_pos_fechamento WHERE periodo_id = %s", (periodo_id,))
+    await db.copiar("bonus_fechados", ["periodo_id"] + COLUNAS_FECHAMENTO, [
+        (periodo_id, *[
+            json.dumps(r[coluna], ensure_ascii=False) if coluna == "detalhes" else r[coluna]
+            for coluna in COLUNAS_FECHAMENTO
+        ])
+        for r in resultados
+    ])
+    return len(resultados), sum(1 for r in resultados if r['recebe_bonus'])
+
+
+async def iterar_fechamento(periodo_id, tamanho_lote: int = 2000):
+    """Resultados congelados de um período fechado, no formato de avaliar_bonus"""
+    async with conexao() as db:
+        async for row in db.stream(f"""
+            SELECT {", ".join(COLUNAS_FECHAMENTO)}
+            FROM bonus_fechados
+            WHERE periodo_id = %s
+            ORDER BY funcionario_id
+        """, (periodo_id,), tamanho_lote):
+            yield dict(row)
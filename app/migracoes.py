@@ -0,0 +1,798 @@
+import psycopg2
+from psycopg2 import errors
+
+# Chave do advisory lock que serializa as migrações entre processos
+LOCK_MIGRACOES = 7420031
+
+
+def _001_esquema_inicial(cursor):
+    # --- Criar tabela funcionarios se não existir ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS funcionarios (
+            id SERIAL PRIMARY KEY,
+            nome TEXT NOT NULL,
+            funcao TEXT NOT NULL,
+            ativo BOOLEAN DEFAULT TRUE,
+            data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Garantir coluna funcao existe
+    cursor.execute("""
+        ALTER TABLE funcionarios
+        ADD COLUMN IF NOT EXISTS funcao TEXT;
+    """)
+
+    # Garantir coluna ativo
+    cursor.execute("""
+        ALTER TABLE funcionarios
+        ADD COLUMN IF NOT EXISTS ativo BOOLEAN DEFAULT TRUE;
+    """)
+
+    # Garantir coluna data_cadastro
+    cursor.execute("""
+        ALTER TABLE funcionarios
+        ADD COLUMN IF NOT EXISTS data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+    """)
+
+    # Adicionar constraint CHECK se não existir (PostgreSQL não tem "IF NOT EXISTS" para CHECK)
+    cursor.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint WHERE conname = 'funcionarios_funcao_check'
+            ) THEN
+                ALTER TABLE funcionarios
+                ADD CONSTRAINT funcionarios_funcao_check
+                CHECK (funcao IN ('LIDER','OPERADOR','AJUDANTE'));
+            END IF;
+        END;
+        $$;
+    """)
+
+    # --------------------------
+    # OCORRENCIAS
+    # --------------------------
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ocorrencias (
+            id SERIAL PRIMARY KEY,
+            funcionario_id INTEGER NOT NULL REFERENCES funcionarios(id),
+            tipo TEXT NOT NULL,
+            data DATE NOT NULL,
+            observacao TEXT,
+            anula_ocorrencia_id INTEGER,
+            registrado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        ALTER TABLE ocorrencias
+        ADD COLUMN IF NOT EXISTS registrado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+    """)
+
+    # --------------------------
+    # REGRAS BONUS
+    # --------------------------
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS regras_bonus (
+            id SERIAL PRIMARY KEY,
+            tipo TEXT UNIQUE NOT NULL,
+            categoria TEXT NOT NULL,
+            desconto REAL NOT NULL,
+            limite INTEGER,
+            descricao TEXT
+        )
+    """)
+
+    # Inserir regras padrão caso não existam
+    regras_padrao = [
+        ('falta','elimina',100,None,'Perde todo o bônus'),
+        ('atestado','limite',100,2,'Mais de 2 atestados perde o bônus'),
+        ('advertencia','elimina',100,None,'Perde todo o bônus'),
+        ('suspensao','elimina',100,None,'Perde todo o bônus'),
+        ('atraso','elimina',100,None,'Perde todo o bônus'),
+        ('saida_antecipada','elimina',100,None,'Perde todo o bônus'),
+        ('reclamacao_qualidade','percentual',10,None,'Reduz 10% do bônus'),
+        ('esqueceu_ponto','percentual',10,None,'Reduz 10% do bônus'),
+        ('avaria_menor','percentual',10,None,'Reduz 10% do bônus'),
+        ('avaria_grave','percentual',20,None,'Reduz 20% do bônus'),
+        ('supermeta_110','bonus',10,1,'Bônus de 10% por supermeta 110%'),
+        ('supermeta_120','bonus',20,1,'Bônus de 20% por supermeta 120%')
+    ]
+
+    for regra in regras_padrao:
+        cursor.execute("""
+            INSERT INTO regras_bonus(tipo, categoria, desconto, limite, descricao)
+            VALUES (%s,%s,%s,%s,%s)
+            ON CONFLICT (tipo) DO NOTHING
+        """, regra)
+
+
+def _002_registrado_em_obrigatorio(cursor):
+    # A paginação por (data, registrado_em, id) não funciona com registrado_em nulo
+    cursor.execute("UPDATE ocorrencias SET registrado_em = CURRENT_TIMESTAMP WHERE registrado_em IS NULL")
+    cursor.execute("ALTER TABLE ocorrencias ALTER COLUMN registrado_em SET NOT NULL")
+
+
+def _003_indices_ocorrencias(cursor):
+    # Bônus por funcionário/período, listagem filtrada por funcionário e
+    # contagem de ocorrências ao excluir funcionário
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ocorrencias_funcionario_data
+        ON ocorrencias (funcionario_id, data, registrado_em, id)
+    """)
+    # Dashboard (data >= início do mês), relatório geral por período e
+    # paginação por (data, registrado_em, id)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ocorrencias_data
+        ON ocorrencias (data, registrado_em, id)
+    """)
+    # Ocorrências anuladas por atestado (pendentes e exclusão)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ocorrencias_anula
+        ON ocorrencias (anula_ocorrencia_id)
+        WHERE anula_ocorrencia_id IS NOT NULL
+    """)
+    cursor.execute("ANALYZE ocorrencias")
+
+
+def _004_restricoes_ocorrencias(cursor):
+    # As validações de registrar_ocorrencia passam a ser feitas pelo banco,
+    # no próprio INSERT. NOT VALID: só vale para linhas novas, assim dados
+    # antigos inconsistentes não impedem a migração.
+    cursor.execute("""
+        ALTER TABLE ocorrencias
+        ADD CONSTRAINT ocorrencias_tipo_fkey
+        FOREIGN KEY (tipo) REFERENCES regras_bonus(tipo) NOT VALID
+    """)
+
+    # Atestado só pode anular falta, atraso ou saída antecipada do mesmo
+    # funcionário: FK composta contra (id, funcionario_id, anulavel). Com
+    # anula_ocorrencia_id nulo a FK não é verificada (MATCH SIMPLE).
+    cursor.execute("""
+        ALTER TABLE ocorrencias
+        ADD COLUMN anulavel BOOLEAN NOT NULL
+            GENERATED ALWAYS AS (tipo IN ('falta', 'atraso', 'saida_antecipada')) STORED,
+        ADD COLUMN alvo_anulavel BOOLEAN
+            GENERATED ALWAYS AS (anula_ocorrencia_id IS NOT NULL) STORED
+    """)
+    cursor.execute("""
+        ALTER TABLE ocorrencias
+        ADD CONSTRAINT ocorrencias_anulacao_alvo_key UNIQUE (id, funcionario_id, anulavel)
+    """)
+    cursor.execute("""
+        ALTER TABLE ocorrencias
+        ADD CONSTRAINT ocorrencias_anulacao_fkey
+        FOREIGN KEY (anula_ocorrencia_id, funcionario_id, alvo_anulavel)
+        REFERENCES ocorrencias(id, funcionario_id, anulavel) NOT VALID
+    """)
+
+
+def _005_ocorrencias_anuladas(cursor):
+    # Marca na própria ocorrência se ela foi anulada por atestado, mantida por
+    # trigger. "Pendentes de anulação" vira uma leitura de índice parcial em vez
+    # de um NOT IN sobre a tabela inteira.
+    cursor.execute("""
+        ALTER TABLE ocorrencias
+        ADD COLUMN IF NOT EXISTS anulada BOOLEAN NOT NULL DEFAULT FALSE
+    """)
+    cursor.execute("""
+        UPDATE ocorrencias o SET anulada = TRUE
+        WHERE EXISTS (SELECT 1 FROM ocorrencias a WHERE a.anula_ocorrencia_id = o.id)
+    """)
+
+    # O UPDATE/lock na ocorrência anulada serializa atestados concorrentes
+    # que apontam para ela; a verificação após o lock já enxerga os demais
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION ocorrencias_atualizar_anulada() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE ocorrencias SET anulada = TRUE WHERE id = NEW.anula_ocorrencia_id;
+                RETURN NEW;
+            END IF;
+
+            PERFORM 1 FROM ocorrencias WHERE id = OLD.anula_ocorrencia_id FOR NO KEY UPDATE;
+            UPDATE ocorrencias SET anulada = FALSE
+            WHERE id = OLD.anula_ocorrencia_id
+            AND NOT EXISTS (
+                SELECT 1 FROM ocorrencias WHERE anula_ocorrencia_id = OLD.anula_ocorrencia_id
+            );
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("""
+        CREATE TRIGGER ocorrencias_anulada_insert
+        AFTER INSERT ON ocorrencias
+        FOR EACH ROW WHEN (NEW.anula_ocorrencia_id IS NOT NULL)
+        EXECUTE FUNCTION ocorrencias_atualizar_anulada()
+    """)
+    cursor.execute("""
+        CREATE TRIGGER ocorrencias_anulada_delete
+        AFTER DELETE ON ocorrencias
+        FOR EACH ROW WHEN (OLD.anula_ocorrencia_id IS NOT NULL)
+        EXECUTE FUNCTION ocorrencias_atualizar_anulada()
+    """)
+
+    # Pendentes de anulação por funcionário, mais recentes primeiro
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ocorrencias_pendentes
+        ON ocorrencias (funcionario_id, data DESC)
+        WHERE anulavel AND NOT anulada
+    """)
+    cursor.execute("ANALYZE ocorrencias")
+
+
+def _006_totais_mensais(cursor):
+    # Contadores por funcionário, mês e tipo efetivo (atestado para quem anula
+    # outra ocorrência), já descontadas as ocorrências anuladas por atestado
+    # do mesmo mês. anulacoes e anulacoes_outro_mes só aparecem na linha de
+    # atestado; anulação entre meses diferentes obriga o cálculo a voltar às
+    # ocorrências, porque depende de quais meses entram no período.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS totais_mensais (
+            funcionario_id INTEGER NOT NULL,
+            mes DATE NOT NULL,
+            tipo TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            primeira_data DATE NOT NULL,
+            primeiro_id INTEGER NOT NULL,
+            anulacoes INTEGER NOT NULL DEFAULT 0,
+            anulacoes_outro_mes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (funcionario_id, mes, tipo)
+        )
+    """)
+
+    # Definição única dos totais: usada pelo trigger (um funcionário/mês por
+    # vez) e pelo verificador de consistência (tabela inteira)
+    cursor.execute("""
+        CREATE OR REPLACE VIEW totais_mensais_esperados AS
+        SELECT
+            o.funcionario_id,
+            date_trunc('month', o.data::timestamp)::date AS mes,
+            CASE WHEN o.anula_ocorrencia_id IS NOT NULL THEN 'atestado' ELSE o.tipo END AS tipo,
+            (COUNT(*) FILTER (WHERE NOT x.excluida))::int AS quantidade,
+            MIN(o.data) FILTER (WHERE NOT x.excluida) AS primeira_data,
+            (array_agg(o.id ORDER BY o.data, o.id) FILTER (WHERE NOT x.excluida))[1] AS primeiro_id,
+            (COUNT(DISTINCT o.anula_ocorrencia_id))::int AS anulacoes,
+            (COUNT(o.anula_ocorrencia_id) FILTER (
+                WHERE date_trunc('month', alvo.data::timestamp) IS DISTINCT FROM date_trunc('month', o.data::timestamp)
+            ))::int AS anulacoes_outro_mes
+        FROM ocorrencias o
+        LEFT JOIN ocorrencias alvo ON alvo.id = o.anula_ocorrencia_id
+        CROSS JOIN LATERAL (
+            SELECT o.anulada AND EXISTS (
+                SELECT 1 FROM ocorrencias a
+                WHERE a.anula_ocorrencia_id = o.id
+                AND date_trunc('month', a.data::timestamp) = date_trunc('month', o.data::timestamp)
+            ) AS excluida
+        ) x
+        GROUP BY 1, 2, 3
+        HAVING COUNT(*) FILTER (WHERE NOT x.excluida) > 0
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION recalcular_totais_mensais(p_funcionario INTEGER, p_mes DATE)
+        RETURNS void AS $$
+        BEGIN
+            -- Serializa recálculos concorrentes do mesmo funcionário. Lock de
+            -- linha, e não advisory lock: um lote grande não esgota a tabela de locks.
+            PERFORM 1 FROM funcionarios WHERE id = p_funcionario FOR NO KEY UPDATE;
+            DELETE FROM totais_mensais WHERE funcionario_id = p_funcionario AND mes = p_mes;
+            INSERT INTO totais_mensais
+            SELECT * FROM totais_mensais_esperados WHERE funcionario_id = p_funcionario AND mes = p_mes;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    # Gatilhos por comando: um lote (importação, batch) recalcula cada
+    # funcionário/mês afetado uma única vez, em ordem de funcionário para os
+    # locks não se cruzarem. Rodam depois dos gatilhos por linha, então a
+    # marcação de anulada já está atualizada.
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION ocorrencias_atualizar_totais() RETURNS trigger AS $$
+        DECLARE
+            r RECORD;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                FOR r IN SELECT DISTINCT funcionario_id, date_trunc('month', data::timestamp)::date AS mes FROM novas ORDER BY 1, 2 LOOP
+                    PERFORM recalcular_totais_mensais(r.funcionario_id, r.mes);
+                END LOOP;
+            ELSE
+                FOR r IN SELECT DISTINCT funcionario_id, date_trunc('month', data::timestamp)::date AS mes FROM antigas ORDER BY 1, 2 LOOP
+                    PERFORM recalcular_totais_mensais(r.funcionario_id, r.mes);
+                END LOOP;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("""
+        CREATE TRIGGER ocorrencias_totais_insert
+        AFTER INSERT ON ocorrencias
+        REFERENCING NEW TABLE AS novas
+        FOR EACH STATEMENT EXECUTE FUNCTION ocorrencias_atualizar_totais()
+    """)
+    cursor.execute("""
+        CREATE TRIGGER ocorrencias_totais_delete
+        AFTER DELETE ON ocorrencias
+        REFERENCING OLD TABLE AS antigas
+        FOR EACH STATEMENT EXECUTE FUNCTION ocorrencias_atualizar_totais()
+    """)
+
+    cursor.execute("INSERT INTO totais_mensais SELECT * FROM totais_mensais_esperados")
+    cursor.execute("ANALYZE totais_mensais")
+
+
+def _007_fechamento_periodos(cursor):
+    # Períodos fechados para a folha e o bônus congelado de cada funcionário
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS periodos_fechados (
+            id SERIAL PRIMARY KEY,
+            data_inicio DATE NOT NULL,
+            data_fim DATE NOT NULL,
+            fechado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            recalculado_em TIMESTAMP,
+            UNIQUE (data_inicio, data_fim),
+            CHECK (data_inicio <= data_fim)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bonus_fechados (
+            periodo_id INTEGER NOT NULL REFERENCES periodos_fechados(id) ON DELETE CASCADE,
+            funcionario_id INTEGER NOT NULL,
+            nome TEXT NOT NULL,
+            bonus_percentual DOUBLE PRECISION NOT NULL,
+            recebe_bonus BOOLEAN NOT NULL,
+            total_ocorrencias INTEGER NOT NULL,
+            atestados INTEGER NOT NULL,
+            detalhes JSONB NOT NULL,
+            ocorrencias_anuladas INTEGER NOT NULL,
+            bonus_positivos DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (periodo_id, funcionario_id)
+        )
+    """)
+
+    # Ocorrências registradas ou excluídas depois do fechamento, dentro do
+    # período fechado: o bônus congelado não muda, mas a alteração fica
+    # registrada até o período ser reaberto e recalculado
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alteracoes_pos_fechamento (
+            id SERIAL PRIMARY KEY,
+            periodo_id INTEGER NOT NULL REFERENCES periodos_fechados(id) ON DELETE CASCADE,
+            operacao TEXT NOT NULL,
+            ocorrencia_id INTEGER NOT NULL,
+            funcionario_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            data DATE NOT NULL,
+            registrado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_alteracoes_pos_fechamento_periodo
+        ON alteracoes_pos_fechamento (periodo_id)
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION ocorrencias_marcar_alteracao_fechada() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO alteracoes_pos_fechamento (periodo_id, operacao, ocorrencia_id, funcionario_id, tipo, data)
+                SELECT p.id, TG_OP, n.id, n.funcionario_id, n.tipo, n.data
+                FROM novas n
+                JOIN periodos_fechados p ON n.data BETWEEN p.data_inicio AND p.data_fim;
+            ELSE
+                INSERT INTO alteracoes_pos_fechamento (periodo_id, operacao, ocorrencia_id, funcionario_id, tipo, data)
+                SELECT p.id, TG_OP, a.id, a.funcionario_id, a.tipo, a.data
+                FROM antigas a
+                JOIN periodos_fechados p ON a.data BETWEEN p.data_inicio AND p.data_fim;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("""
+        CREATE TRIGGER ocorrencias_fechamento_insert
+        AFTER INSERT ON ocorrencias
+        REFERENCING NEW TABLE AS novas
+        FOR EACH STATEMENT EXECUTE FUNCTION ocorrencias_marcar_alteracao_fechada()
+    """)
+    cursor.execute("""
+        CREATE TRIGGER ocorrencias_fechamento_delete
+        AFTER DELETE ON ocorrencias
+        REFERENCING OLD TABLE AS antigas
+        FOR EACH STATEMENT EXECUTE FUNCTION ocorrencias_marcar_alteracao_fechada()
+    """)
+
+
+
+def _008_marca_dados(cursor):
+    # Marca d'água das alterações que mudam relatórios: um contador avançado
+    # por qualquer comando em ocorrências, funcionários, regras ou fechamentos.
+    # Por ser uma linha comum, quem lê a marca antes dos dados nunca associa
+    # dados antigos a uma marca nova.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS marca_dados (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            versao BIGINT NOT NULL
+        )
+    """)
+    cursor.execute("INSERT INTO marca_dados (versao) VALUES (1) ON CONFLICT DO NOTHING")
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION avancar_marca_dados() RETURNS trigger AS $$
+        BEGIN
+            UPDATE marca_dados SET versao = versao + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for tabela in ("ocorrencias", "funcionarios", "regras_bonus", "periodos_fechados", "bonus_fechados"):
+        cursor.execute(f"""
+            CREATE TRIGGER {tabela}_marca_dados
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {tabela}
+            FOR EACH STATEMENT EXECUTE FUNCTION avancar_marca_dados()
+        """)
+
+
+def _009_marca_dados_por_conexao(cursor):
+    # A linha única da marca d'água virava um ponto de deadlock: uma gravação
+    # de ocorrências tomava a marca antes de travar o funcionário nos totais,
+    # e uma alteração de funcionário fazia o contrário. Cada processo do
+    # servidor passa a avançar só a própria linha e a marca é a soma; como só
+    # cresce com commits, a regra de ler a marca antes dos dados continua valendo.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS marcas_dados (
+            processo INTEGER PRIMARY KEY,
+            versao BIGINT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO marcas_dados (processo, versao)
+        SELECT 0, versao FROM marca_dados
+        ON CONFLICT DO NOTHING
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION avancar_marca_dados() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO marcas_dados (processo, versao) VALUES (pg_backend_pid(), 1)
+            ON CONFLICT (processo) DO UPDATE SET versao = marcas_dados.versao + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("DROP TABLE IF EXISTS marca_dados")
+
+
+def _010_totais_diarios(cursor):
+    # Série diária de ocorrências por data, tipo (o registrado, sem considerar
+    # anulações) e função atual do funcionário, para gráficos de tendência
+    # sem agrupar a tabela de ocorrências a cada consulta
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS totais_diarios (
+            data DATE NOT NULL,
+            tipo TEXT NOT NULL,
+            funcao TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            PRIMARY KEY (data, tipo, funcao)
+        )
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE VIEW totais_diarios_esperados AS
+        SELECT o.data, o.tipo, COALESCE(f.funcao, '') AS funcao, COUNT(*)::int AS quantidade
+        FROM ocorrencias o
+        JOIN funcionarios f ON f.id = o.funcionario_id
+        GROUP BY 1, 2, 3
+    """)
+
+    # Os funcionários do comando são travados antes das linhas da série, em
+    # ordem: a troca de função (abaixo) trava o funcionário e depois a série,
+    # e os totais mensais também travam o funcionário, então a ordem
+    # funcionário -> série vale para todos e os locks não se cruzam
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION ocorrencias_atualizar_totais_diarios() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM 1 FROM funcionarios
+                WHERE id IN (SELECT funcionario_id FROM novas)
+                ORDER BY id FOR NO KEY UPDATE;
+                INSERT INTO totais_diarios (data, tipo, funcao, quantidade)
+                SELECT n.data, n.tipo, COALESCE(f.funcao, ''), COUNT(*)
+                FROM novas n
+                JOIN funcionarios f ON f.id = n.funcionario_id
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 2, 3
+                ON CONFLICT (data, tipo, funcao)
+                DO UPDATE SET quantidade = totais_diarios.quantidade + EXCLUDED.quantidade;
+            ELSE
+                PERFORM 1 FROM funcionarios
+                WHERE id IN (SELECT funcionario_id FROM antigas)
+                ORDER BY id FOR NO KEY UPDATE;
+                UPDATE totais_diarios d SET quantidade = d.quantidade - a.quantidade
+                FROM (
+                    SELECT x.data, x.tipo, COALESCE(f.funcao, '') AS funcao, COUNT(*) AS quantidade
+                    FROM antigas x
+                    JOIN funcionarios f ON f.id = x.funcionario_id
+                    GROUP BY 1, 2, 3
+                ) a
+                WHERE d.data = a.data AND d.tipo = a.tipo AND d.funcao = a.funcao;
+                DELETE FROM totais_diarios
+                WHERE data IN (SELECT data FROM antigas) AND quantidade <= 0;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("""
+        CREATE TRIGGER ocorrencias_totais_diarios_insert
+        AFTER INSERT ON ocorrencias
+        REFERENCING NEW TABLE AS novas
+        FOR EACH STATEMENT EXECUTE FUNCTION ocorrencias_atualizar_totais_diarios()
+    """)
+    cursor.execute("""
+        CREATE TRIGGER ocorrencias_totais_diarios_delete
+        AFTER DELETE ON ocorrencias
+        REFERENCING OLD TABLE AS antigas
+        FOR EACH STATEMENT EXECUTE FUNCTION ocorrencias_atualizar_totais_diarios()
+    """)
+
+    # Troca de função: as ocorrências do funcionário passam para a nova função
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION funcionarios_mover_totais_diarios() RETURNS trigger AS $$
+        BEGIN
+            UPDATE totais_diarios d SET quantidade = d.quantidade - m.quantidade
+            FROM (
+                SELECT data, tipo, COUNT(*) AS quantidade
+                FROM ocorrencias WHERE funcionario_id = NEW.id
+                GROUP BY 1, 2
+            ) m
+            WHERE d.data = m.data AND d.tipo = m.tipo AND d.funcao = COALESCE(OLD.funcao, '');
+            DELETE FROM totais_diarios
+            WHERE data IN (SELECT data FROM ocorrencias WHERE funcionario_id = NEW.id) AND quantidade <= 0;
+            INSERT INTO totais_diarios (data, tipo, funcao, quantidade)
+            SELECT data, tipo, COALESCE(NEW.funcao, ''), COUNT(*)
+            FROM ocorrencias WHERE funcionario_id = NEW.id
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+            ON CONFLICT (data, tipo, funcao)
+            DO UPDATE SET quantidade = totais_diarios.quantidade + EXCLUDED.quantidade;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("""
+        CREATE TRIGGER funcionarios_totais_diarios_funcao
+        AFTER UPDATE OF funcao ON funcionarios
+        FOR EACH ROW
+        WHEN (OLD.funcao IS DISTINCT FROM NEW.funcao)
+        EXECUTE FUNCTION funcionarios_mover_totais_diarios()
+    """)
+
+    cursor.execute("INSERT INTO totais_diarios SELECT * FROM totais_diarios_esperados")
+    cursor.execute("ANALYZE totais_diarios")
+
+
+def _011_avisos_alteracao(cursor):
+    # Aviso (NOTIFY) a cada comando que altera funcionários, ocorrências ou
+    # regras, para os outros processos do servidor descartarem os caches.
+    # O aviso leva o application_name da conexão que gravou; avisos iguais
+    # na mesma transação são entregues uma única vez, no commit
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION avisar_alteracao() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('bonificacao_alteracoes', json_build_object(
+                'tabela', TG_TABLE_NAME,
+                'origem', current_setting('application_name')
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for tabela in ("funcionarios", "ocorrencias", "regras_bonus"):
+        cursor.execute(f"""
+            CREATE TRIGGER {tabela}_avisar_alteracao
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {tabela}
+            FOR EACH STATEMENT EXECUTE FUNCTION avisar_alteracao()
+        """)
+
+
+def _012_compactar_marcas_dados(cursor):
+    # marcas_dados ganha uma linha por conexão do banco (pg_backend_pid) e o
+    # pool troca conexões com o tempo. A função soma na linha 0 as linhas de
+    # conexões já encerradas e as remove, no mesmo comando; a soma não muda,
+    # então a marca continua só crescendo. Retorna quantas linhas removeu.
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION compactar_marcas_dados() RETURNS integer AS $$
+        DECLARE
+            linhas integer;
+            total bigint;
+        BEGIN
+            WITH encerradas AS (
+                DELETE FROM marcas_dados m
+                WHERE m.processo <> 0
+                  AND NOT EXISTS (SELECT 1 FROM pg_stat_activity a WHERE a.pid = m.processo)
+                RETURNING m.versao
+            )
+            SELECT COUNT(*), COALESCE(SUM(versao), 0) INTO linhas, total FROM encerradas;
+            IF linhas > 0 THEN
+                UPDATE marcas_dados SET versao = versao + total WHERE processo = 0;
+            END IF;
+            RETURN linhas;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def _013_regras_fechamento(cursor):
+    # Regras de bônus usadas no cálculo de cada fechamento (tipo -> regra),
+    # para os totais do período seguirem as regras daquele momento. Para
+    # fechamentos anteriores a esta migração só existem as regras atuais.
+    cursor.execute("ALTER TABLE periodos_fechados ADD COLUMN IF NOT EXISTS regras JSONB")
+    cursor.execute("""
+        UPDATE periodos_fechados SET regras = (
+            SELECT jsonb_object_agg(tipo, jsonb_build_object(
+                'categoria', categoria, 'desconto', desconto, 'limite', limite
+            ))
+            FROM regras_bonus
+        )
+        WHERE regras IS NULL
+    """)
+
+
+def _014_ordem_totais_diarios(cursor):
+    # A série diária era decrementada com UPDATE ... FROM, que trava as linhas
+    # em ordem arbitrária, e a troca de função mexia primeiro nas linhas da
+    # função antiga e depois nas da nova: duas trocas opostas simultâneas (ou
+    # uma troca e um lote de ocorrências) se travavam em ordem cruzada.
+    # Agora toda escrita na série é um único upsert em ordem de
+    # (data, tipo, funcao), com os decrementos como quantidades negativas, e
+    # a limpeza só olha as chaves que o próprio comando já travou
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION ocorrencias_atualizar_totais_diarios() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM 1 FROM funcionarios
+                WHERE id IN (SELECT funcionario_id FROM novas)
+                ORDER BY id FOR NO KEY UPDATE;
+                INSERT INTO totais_diarios (data, tipo, funcao, quantidade)
+                SELECT n.data, n.tipo, COALESCE(f.funcao, ''), COUNT(*)
+                FROM novas n
+                JOIN funcionarios f ON f.id = n.funcionario_id
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 2, 3
+                ON CONFLICT (data, tipo, funcao)
+                DO UPDATE SET quantidade = totais_diarios.quantidade + EXCLUDED.quantidade;
+            ELSE
+                PERFORM 1 FROM funcionarios
+                WHERE id IN (SELECT funcionario_id FROM antigas)
+                ORDER BY id FOR NO KEY UPDATE;
+                INSERT INTO totais_diarios (data, tipo, funcao, quantidade)
+                SELECT a.data, a.tipo, COALESCE(f.funcao, ''), -COUNT(*)
+                FROM antigas a
+                JOIN funcionarios f ON f.id = a.funcionario_id
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 2, 3
+                ON CONFLICT (data, tipo, funcao)
+                DO UPDATE SET quantidade = totais_diarios.quantidade + EXCLUDED.quantidade;
+                DELETE FROM totais_diarios d
+                USING antigas a
+                JOIN funcionarios f ON f.id = a.funcionario_id
+                WHERE d.data = a.data AND d.tipo = a.tipo AND d.funcao = COALESCE(f.funcao, '')
+                  AND d.quantidade <= 0;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION funcionarios_mover_totais_diarios() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO totais_diarios (data, tipo, funcao, quantidade)
+            SELECT m.data, m.tipo, f.funcao, m.quantidade * f.sinal
+            FROM (
+                SELECT data, tipo, COUNT(*) AS quantidade
+                FROM ocorrencias WHERE funcionario_id = NEW.id
+                GROUP BY 1, 2
+            ) m
+            CROSS JOIN (
+                VALUES (COALESCE(OLD.funcao, ''), -1), (COALESCE(NEW.funcao, ''), 1)
+            ) f (funcao, sinal)
+            ORDER BY 1, 2, 3
+            ON CONFLICT (data, tipo, funcao)
+            DO UPDATE SET quantidade = totais_diarios.quantidade + EXCLUDED.quantidade;
+            DELETE FROM totais_diarios
+            WHERE (data, tipo) IN (SELECT data, tipo FROM ocorrencias WHERE funcionario_id = NEW.id)
+              AND funcao = COALESCE(OLD.funcao, '') AND quantidade <= 0;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+# Lista ordenada de migrações: (versão, descrição, função que recebe o cursor).
+# Para mudar o esquema, acrescente uma nova entrada no final; nunca altere
+# uma migração já publicada.
+MIGRACOES = [
+    (1, "Esquema inicial e regras padrão", _001_esquema_inicial),
+    (2, "registrado_em obrigatório", _002_registrado_em_obrigatorio),
+    (3, "Índices das consultas de ocorrências", _003_indices_ocorrencias),
+    (4, "Tipo e anulação validados por restrições", _004_restricoes_ocorrencias),
+    (5, "Marcação de ocorrências anuladas", _005_ocorrencias_anuladas),
+    (6, "Totais mensais de ocorrências por funcionário", _006_totais_mensais),
+    (7, "Fechamento de períodos", _007_fechamento_periodos),
+    (8, "Marca d'água de alterações dos relatórios", _008_marca_dados),
+    (9, "Marca d'água por processo do servidor", _009_marca_dados_por_conexao),
+    (10, "Série diária de ocorrências por tipo e função", _010_totais_diarios),
+    (11, "Avisos de alteração entre processos do servidor", _011_avisos_alteracao),
+    (12, "Compactação da marca d'água de conexões encerradas", _012_compactar_marcas_dados),
+    (13, "Regras usadas em cada fechamento", _013_regras_fechamento),
+    (14, "Ordem de travamento da série diária", _014_ordem_totais_diarios),
+]
+
+
+def versao_atual(conn):
+    """Versão do esquema registrada no banco (0 se nunca migrado).
+
+    Uma única consulta em autocommit, sem abrir transação. A tabela só falta
+    em um banco novo: o PostgreSQL resolve os nomes antes de executar, então
+    nem um CASE com to_regclass evita o erro nesse caso.
+    """
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(versao), 0) AS versao FROM schema_migracoes")
+        return cursor.fetchone()['versao']
+    except errors.UndefinedTable:
+        return 0
+    finally:
+        conn.autocommit = autocommit
+
+
+def aplicar_migracoes(conn, migracoes=MIGRACOES):
+    """Aplica as migrações pendentes e retorna as versões aplicadas.
+
+    Com o esquema em dia, custa uma única consulta.
+    """
+    ultima = migracoes[-1][0]
+    if versao_atual(conn) >= ultima:
+        return []
+
+    cursor = conn.cursor()
+    try:
+        # CREATE TABLE IF NOT EXISTS não é seguro entre sessões simultâneas
+        # (vários workers subindo num banco novo): cria sob o mesmo lock
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_MIGRACOES,))
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migracoes (
+                versao INTEGER PRIMARY KEY,
+                descricao TEXT NOT NULL,
+                aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+
+    aplicadas = []
+    for versao, descricao, migracao in migracoes:
+        try:
+            # Outro worker pode ter aplicado a migração enquanto esperávamos o lock
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_MIGRACOES,))
+            cursor.execute("SELECT 1 FROM schema_migracoes WHERE versao = %s", (versao,))
+            if cursor.fetchone():
+                conn.rollback()
+                continue
+
+            migracao(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migracoes (versao, descricao) VALUES (%s, %s)",
+                (versao, descricao)
+            )
+            conn.commit()
+            aplicadas.append(versao)
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+
+    return aplicadas
@@ -0,0 +1,195 @@
+"""Verificação dos planos de execução das consultas dos routers.
+
+Executa os endpoints contra o banco configurado, roda EXPLAIN em cada
+consulta que eles fazem e falha se alguma tabela vigiada for lida com
+Seq Scan. Se a tabela de ocorrências estiver vazia, ela é populada com uma
+massa grande de dados antes — use um banco descartável:
+
+    BONIFICACAO_DB_NAME=bonificacao_planos python -m app.planos
+"""
+import asyncio
+import sys
+from datetime import date, timedelta
+
+import psycopg2
+from fastapi import HTTPException
+from psycopg2.extras import RealDictCursor
+
+from app import database, database_async
+from app.database import DB_CONFIG, PoolConexoes, init_db
+
+# Tabelas que crescem com o uso e nunca devem ser varridas por inteiro
+TABELAS_VIGIADAS = {"ocorrencias", "totais_mensais", "totais_diarios"}
+
+FUNCIONARIOS_SEMENTE = 4000
+OCORRENCIAS_SEMENTE = 400000
+
+_planos = []
+
+
+class CursorExplain(RealDictCursor):
+    """Cursor que registra o plano de cada consulta antes de executá-la"""
+
+    def execute(self, query, vars=None):
+        texto = query.decode() if isinstance(query, bytes) else query
+        if texto.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH", "UPDATE", "DELETE"):
+            # Cursores nomeados não aceitam EXPLAIN; usa um cursor comum da mesma conexão
+            explain = psycopg2.extensions.connection.cursor(self.connection, cursor_factory=RealDictCursor)
+            explain.execute("EXPLAIN (FORMAT JSON) " + texto, vars)
+            _planos.append((" ".join(texto.split()), explain.fetchone()["QUERY PLAN"][0]["Plan"]))
+            explain.close()
+        return super().execute(query, vars)
+
+
+class ConexaoExplain(psycopg2.extensions.connection):
+    def cursor(self, *args, **kwargs):
+        kwargs["cursor_factory"] = CursorExplain
+        return super().cursor(*args, **kwargs)
+
+
+class PoolExplain(PoolConexoes):
+    def _abrir(self):
+        return psycopg2.connect(connection_factory=ConexaoExplain, **DB_CONFIG)
+
+
+def _varreduras(plano):
+    """Relações lidas com Seq Scan em um plano (recursivo)"""
+    encontradas = []
+    if plano.get("Node Type") == "Seq Scan":
+        encontradas.append(plano.get("Relation Name"))
+    for filho in plano.get("Plans", []):
+        encontradas.extend(_varreduras(filho))
+    return encontradas
+
+
+def semear(conn, funcionarios=FUNCIONARIOS_SEMENTE, ocorrencias=OCORRENCIAS_SEMENTE):
+    """Popula um banco vazio com funcionários e ~3 anos de ocorrências"""
+    cursor = conn.cursor()
+    # Os totais mensais são reconstruídos de uma vez no final, em vez de um
+    # recálculo por funcionário/mês durante a carga
+    cursor.execute("ALTER TABLE ocorrencias DISABLE TRIGGER ocorrencias_totais_insert")
+    cursor.execute("""
+        INSERT INTO funcionarios (nome, funcao, ativo)
+        SELECT 'Funcionário ' || g, (ARRAY['LIDER','OPERADOR','AJUDANTE'])[1 + g %% 3], g %% 10 <> 0
+        FROM generate_series(1, %s) g
+    """, (funcionarios,))
+    cursor.execute("""
+        WITH f AS (SELECT MIN(id) AS primeiro, COUNT(*) AS total FROM funcionarios),
+             t AS (SELECT array_agg(tipo ORDER BY tipo) AS tipos FROM regras_bonus)
+        INSERT INTO ocorrencias (funcionario_id, tipo, data, registrado_em)
+        SELECT
+            f.primeiro + (g %% f.total),
+            t.tipos[1 + (g %% array_length(t.tipos, 1))],
+            CURRENT_DATE - ((g::bigint * 7919) %% 1095)::int,
+            CURRENT_TIMESTAMP - ((g::bigint * 7919) %% 1095) * INTERVAL '1 day'
+        FROM generate_series(1, %s) g, f, t
+    """, (ocorrencias,))
+    # Parte das faltas anuladas por atestado
+    cursor.execute("""
+        INSERT INTO ocorrencias (funcionario_id, tipo, data, anula_ocorrencia_id)
+        SELECT funcionario_id, 'atestado', data, id
+        FROM ocorrencias
+        WHERE tipo = 'falta' AND id % 3 = 0
+    """)
+    cursor.execute("ALTER TABLE ocorrencias ENABLE TRIGGER ocorrencias_totais_insert")
+    cursor.execute("DELETE FROM totais_mensais")
+    cursor.execute("INSERT INTO totais_mensais SELECT * FROM totais_mensais_esperados")
+    conn.commit()
+
+
+def cenarios(funcionario_id):
+    """Chamadas aos endpoints cujas consultas são verificadas"""
+    from starlette.requests import Request
+    from app.models import PeriodoRelatorio
+    from app.routers import dashboard, funcionarios, ocorrencias, relatorios
+
+    # Requisição sem If-None-Match: o cache de relatórios sempre responde 200
+    requisicao = Request({"type": "http", "headers": []})
+
+    hoje = date.today()
+    inicio_mes = hoje.replace(day=1).isoformat()
+    fim_mes = hoje.isoformat()
+    ontem = (hoje - timedelta(days=1)).isoformat()
+    fim_mes_anterior = hoje.replace(day=1) - timedelta(days=1)
+    inicio_trimestre = (fim_mes_anterior - timedelta(days=62)).replace(day=1).isoformat()
+
+    async def listar(**filtros):
+        parametros = dict(funcionario_id=None, data_inicio=None, data_fim=None, tipo=None,
+                          limite=100, cursor=None, fields=None)
+        parametros.update(filtros)
+        return await ocorrencias.listar_ocorrencias(**parametros)
+
+    async def segunda_pagina():
+        return await listar(cursor=(await listar())["proximo_cursor"])
+
+    return [
+        ("GET /dashboard", dashboard.dashboard_resumo),
+        ("GET /dashboard/serie", lambda: dashboard.dashboard_serie(inicio_trimestre, fim_mes, "dia", None)),
+        ("GET /ocorrencias", listar),
+        ("GET /ocorrencias (próxima página)", segunda_pagina),
+        ("GET /ocorrencias?funcionario_id", lambda: listar(funcionario_id=str(funcionario_id))),
+        ("GET /ocorrencias?data_inicio&data_fim", lambda: listar(data_inicio=ontem, data_fim=fim_mes)),
+        ("GET /ocorrencias/{id}/pendentes", lambda: ocorrencias.listar_ocorrencias_pendentes_anulacao(str(funcionario_id))),
+        ("DELETE /ocorrencias/{id}", lambda: ocorrencias.deletar_ocorrencia(-1)),
+        ("GET /funcionarios/{id}", lambda: funcionarios.obter_funcionario(funcionario_id)),
+        ("GET /bonus/{id}", lambda: relatorios.calcular_bonus(requisicao, str(funcionario_id), inicio_mes, fim_mes)),
+        ("GET /bonus/{id} (meses inteiros)", lambda: relatorios.calcular_bonus(requisicao, str(funcionario_id), inicio_trimestre, fim_mes_anterior.isoformat())),
+        ("POST /relatorio/geral", lambda: relatorios.relatorio_geral(requisicao, PeriodoRelatorio(data_inicio=inicio_mes, data_fim=fim_mes), formato=None, agregados=None)),
+        ("POST /relatorio/geral?agregados=somente", lambda: relatorios.relatorio_geral(requisicao, PeriodoRelatorio(data_inicio=inicio_trimestre, data_fim=fim_mes), formato=None, agregados="somente")),
+    ]
+
+
+def verificar_planos():
+    """Executa os cenários e retorna a lista de (cenário, consulta, tabela) com Seq Scan"""
+    init_db()
+
+    conn = database.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM ocorrencias) AS populado")
+        if not cursor.fetchone()["populado"]:
+            print(f"Populando banco com {OCORRENCIAS_SEMENTE} ocorrências...")
+            semear(conn)
+        cursor.execute("SELECT funcionario_id FROM ocorrencias ORDER BY id LIMIT 1")
+        funcionario_id = cursor.fetchone()["funcionario_id"]
+        conn.commit()
+        conn.autocommit = True
+        cursor.execute("VACUUM ANALYZE")
+        conn.autocommit = False
+    finally:
+        conn.close()
+
+    # Troca o pool do processo por um que registra os planos; os routers
+    # usam o backend síncrono, que empresta conexões desse pool
+    database.fechar_pool()
+    database._pool = PoolExplain()
+    database_async.usar_modo("sync")
+
+    falhas = []
+    try:
+        for nome, chamada in cenarios(funcionario_id):
+            _planos.clear()
+            try:
+                asyncio.run(chamada())
+            except HTTPException:
+                pass
+            for consulta, plano in _planos:
+                for tabela in _varreduras(plano):
+                    if tabela in TABELAS_VIGIADAS:
+                        falhas.append((nome, consulta, tabela))
+            print(f"{'FALHOU' if any(f[0] == nome for f in falhas) else 'ok':>6}  {nome} ({len(_planos)} consultas)")
+    finally:
+        database.fechar_pool()
+
+    return falhas
+
+
+def main():
+    falhas = verificar_planos()
+    for nome, consulta, tabela in falhas:
+        print(f"\nSeq Scan em {tabela} no cenário {nome}:\n  {consulta}")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
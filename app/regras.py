@@ -0,0 +1,71 @@
+import threading
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+from app.database_async import conexao
+
+
+class Regra(NamedTuple):
+    categoria: str
+    desconto: float
+    limite: Optional[int]
+
+
+class RegrasCompiladas(NamedTuple):
+    versao: int
+    por_tipo: Mapping[str, Regra]
+
+
+def compilar_regras(linhas):
+    """Converte linhas de regras_bonus em um mapeamento imutável tipo -> Regra"""
+    return MappingProxyType({
+        row['tipo']: Regra(row['categoria'], row['desconto'], row['limite'])
+        for row in linhas
+    })
+
+
+async def carregar_regras(db):
+    """Carrega as regras de bônus direto do banco"""
+    return compilar_regras(await db.fetchall("SELECT tipo, categoria, desconto, limite FROM regras_bonus"))
+
+
+# Cache das regras no processo. A versão avança a cada invalidação, assim uma
+# carga que começou antes de uma escrita não sobrescreve o cache com dados velhos.
+_lock = threading.Lock()
+_versao = 0
+_cache = None
+
+
+async def obter_regras():
+    """Retorna as regras compiladas, carregando do banco apenas se necessário"""
+    cache = _cache
+    if cache is not None:
+        return cache
+
+    with _lock:
+        versao = _versao
+
+    async with conexao() as db:
+        regras = await carregar_regras(db)
+
+    compiladas = RegrasCompiladas(versao, regras)
+    _armazenar(compiladas)
+    return compiladas
+
+
+def _armazenar(compiladas):
+    global _cache
+    with _lock:
+        if compiladas.versao == _versao:
+            _cache = compiladas
+
+
+def invalidar_regras():
+    """Descarta o cache; chamado após qualquer escrita em regras_bonus"""
+    global _versao, _cache
+    with _lock:
+        _versao += 1
+        _cache = None
+
+
+def versao_regras():
+    return _versao
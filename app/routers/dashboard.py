@@ -1,39 +1,101 @@
-from fastapi import APIRouter
-from app.database import get_db_connection
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app import contadores_dashboard
+from app.bonus import dividir_periodo
+from app.database_async import conexao
+from app.models import FuncaoEnumFuncionario
+from typing import Optional
 from datetime import date
+import json
 
 router = APIRouter()
 
 @router.get("/dashboard")
-def dashboard_resumo():
-    """Retorna estatísticas para o dashboard"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Total de funcionários ativos
-    cursor.execute("SELECT COUNT(*) AS total FROM funcionarios WHERE ativo = TRUE")
-    total_func = cursor.fetchone()['total']
-
-    # Ocorrências do mês atual
-    hoje = date.today()
-    primeiro_dia = hoje.replace(day=1)
-    cursor.execute("SELECT COUNT(*) AS total FROM ocorrencias WHERE data >= %s", (primeiro_dia,))
-    ocorrencias_mes = cursor.fetchone()['total']
-
-    # Ocorrências por tipo no mês
-    cursor.execute("""
-        SELECT tipo, COUNT(*) AS qtd
-        FROM ocorrencias
-        WHERE data >= %s
-        GROUP BY tipo
-        ORDER BY qtd DESC
-    """, (primeiro_dia,))
-    ocorrencias_por_tipo = cursor.fetchall()
-
-    conn.close()
+async def dashboard_resumo():
+    """Retorna estatísticas para o dashboard (contadores mantidos em memória)"""
+    return await contadores_dashboard.resumo()
+
+
+async def _eventos_dashboard():
+    # O navegador reconecta sozinho; o primeiro evento traz o resumo completo
+    yield "retry: 5000\n\n"
+    async for dados in contadores_dashboard.assinar():
+        if dados is None:
+            yield ": ping\n\n"
+        else:
+            yield f"event: dashboard\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+@router.get("/dashboard/eventos")
+async def dashboard_eventos():
+    """Stream (Server-Sent Events) com o resumo do dashboard e, depois, só o que mudar"""
+    return StreamingResponse(
+        _eventos_dashboard(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Granularidade da série -> unidade do date_trunc
+UNIDADES_SERIE = {"dia": "day", "semana": "week", "mes": "month"}
+LIMITE_PONTOS_SERIE = 1500
+
+
+@router.get("/dashboard/serie")
+async def dashboard_serie(
+    data_inicio: str = Query(..., description="Data início (YYYY-MM-DD)"),
+    data_fim: str = Query(..., description="Data fim (YYYY-MM-DD)"),
+    granularidade: str = Query("dia", description="dia, semana (segunda a domingo) ou mes"),
+    funcao: Optional[FuncaoEnumFuncionario] = Query(None, description="Só ocorrências de funcionários desta função")
+):
+    """Série de ocorrências por tipo, lida da tabela de totais diários"""
+    if granularidade not in UNIDADES_SERIE:
+        raise HTTPException(status_code=400, detail="Granularidade inválida (use dia, semana ou mes)")
+    try:
+        inicio = date.fromisoformat(data_inicio)
+        fim = date.fromisoformat(data_fim)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data inválida")
+    if inicio > fim:
+        raise HTTPException(status_code=400, detail="Data início deve ser anterior à data fim")
+
+    faixas = dividir_periodo(inicio, fim, granularidade)
+    if len(faixas) > LIMITE_PONTOS_SERIE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Período muito longo: no máximo {LIMITE_PONTOS_SERIE} pontos por consulta"
+        )
+
+    async with conexao() as db:
+        # A primeira faixa começa na data pedida, não no início da semana/mês
+        linhas = await db.fetchall(f"""
+            SELECT
+                GREATEST(date_trunc('{UNIDADES_SERIE[granularidade]}', data::timestamp)::date, %s) AS inicio,
+                tipo,
+                SUM(quantidade)::int AS quantidade
+            FROM totais_diarios
+            WHERE data >= %s AND data <= %s
+            {"AND funcao = %s" if funcao else ""}
+            GROUP BY 1, 2
+        """, (inicio, inicio, fim, *([funcao.name] if funcao else [])))
+
+    por_faixa = {}
+    for row in linhas:
+        por_faixa.setdefault(row['inicio'], {})[row['tipo']] = row['quantidade']
+
+    serie = []
+    for faixa_inicio, faixa_fim in faixas:
+        por_tipo = por_faixa.get(faixa_inicio, {})
+        serie.append({
+            "inicio": faixa_inicio,
+            "fim": faixa_fim,
+            "total": sum(por_tipo.values()),
+            "por_tipo": dict(sorted(por_tipo.items(), key=lambda item: (-item[1], item[0])))
+        })
 
     return {
-        "total_funcionarios": total_func,
-        "ocorrencias_mes_atual": ocorrencias_mes,
-        "ocorrencias_por_tipo": ocorrencias_por_tipo
+        "periodo": {"inicio": data_inicio, "fim": data_fim},
+        "granularidade": granularidade,
+        "funcao": funcao.name if funcao else None,
+        "serie": serie
     }
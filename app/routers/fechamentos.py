@@ -0,0 +1,95 @@
+from fastapi import APIRouter, HTTPException
+from datetime import date
+from app.database_async import ErroBanco, conexao
+from app.fechamentos import gravar_fechamento
+from app.models import PeriodoRelatorio
+
+router = APIRouter()
+
+
+@router.get("/fechamentos")
+async def listar_fechamentos():
+    """Lista os períodos fechados e quantas alterações chegaram depois do fechamento"""
+    async with conexao() as db:
+        return await db.fetchall("""
+            SELECT
+                p.id,
+                p.data_inicio,
+                p.data_fim,
+                p.fechado_em,
+                p.recalculado_em,
+                (SELECT COUNT(*) FROM alteracoes_pos_fechamento a WHERE a.periodo_id = p.id) AS alteracoes_pendentes
+            FROM periodos_fechados p
+            ORDER BY p.data_inicio DESC, p.data_fim DESC
+        """)
+
+
+@router.post("/fechamentos")
+async def fechar_periodo(periodo: PeriodoRelatorio):
+    """Fecha um período: calcula e congela o bônus de todos os funcionários ativos"""
+    try:
+        data_inicio = date.fromisoformat(periodo.data_inicio)
+        data_fim = date.fromisoformat(periodo.data_fim)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data inválida")
+    if data_inicio > data_fim:
+        raise HTTPException(status_code=400, detail="Data início deve ser anterior à data fim")
+
+    async with conexao() as db:
+        try:
+            row = await db.fetchone("""
+                INSERT INTO periodos_fechados (data_inicio, data_fim)
+                VALUES (%s, %s)
+                RETURNING id
+            """, (data_inicio, data_fim))
+        except ErroBanco as e:
+            if e.constraint == "periodos_fechados_data_inicio_data_fim_key":
+                raise HTTPException(status_code=409, detail="Período já está fechado")
+            raise
+
+        total, recebem = await gravar_fechamento(db, row['id'], data_inicio, data_fim)
+        await db.commit()
+
+    return {
+        "message": "Período fechado com sucesso",
+        "id": row['id'],
+        "total_funcionarios": total,
+        "recebem_bonus": recebem
+    }
+
+
+@router.get("/fechamentos/{periodo_id}/alteracoes")
+async def listar_alteracoes_pos_fechamento(periodo_id: int):
+    """Ocorrências registradas ou excluídas no período depois do fechamento"""
+    async with conexao() as db:
+        if not await db.fetchone("SELECT 1 FROM periodos_fechados WHERE id = %s", (periodo_id,)):
+            raise HTTPException(status_code=404, detail="Fechamento não encontrado")
+        return await db.fetchall("""
+            SELECT operacao, ocorrencia_id, funcionario_id, tipo, data, registrado_em
+            FROM alteracoes_pos_fechamento
+            WHERE periodo_id = %s
+            ORDER BY id
+        """, (periodo_id,))
+
+
+@router.post("/fechamentos/{periodo_id}/reabrir")
+async def reabrir_periodo(periodo_id: int):
+    """Reabre um período fechado e congela novamente o bônus com os dados atuais"""
+    async with conexao() as db:
+        row = await db.fetchone("""
+            UPDATE periodos_fechados SET recalculado_em = CURRENT_TIMESTAMP
+            WHERE id = %s
+            RETURNING data_inicio, data_fim
+        """, (periodo_id,))
+        if not row:
+            raise HTTPException(status_code=404, detail="Fechamento não encontrado")
+
+        total, recebem = await gravar_fechamento(db, periodo_id, row['data_inicio'], row['data_fim'])
+        await db.commit()
+
+    return {
+        "message": "Período recalculado com sucesso",
+        "id": periodo_id,
+        "total_funcionarios": total,
+        "recebem_bonus": recebem
+    }
@@ -1,71 +1,49 @@
 from fastapi import APIRouter, HTTPException
-from app.database import get_db_connection
+from app import cache_funcionarios, contadores_dashboard
+from app.database_async import conexao
 from app.models import Funcionario, FuncionarioUpdate, FuncaoEnumFuncionario
-from psycopg2.extras import RealDictCursor
 
 router = APIRouter()
 
 @router.post("/funcionarios")
-def criar_funcionario(funcionario: Funcionario):
+async def criar_funcionario(funcionario: Funcionario):
     print("📥 RECEBIDO NO BACKEND:", funcionario)
     print("📥 TIPO DO OBJETO:", type(funcionario))
     print("📥 FUNCAO:", funcionario.funcao)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    async with contadores_dashboard.alteracao() as alteracao, conexao() as db:
+        try:
+            # ⬇️ AQUI É A LINHA CORRETA — usa .name que SEMPRE retorna 'LIDER'
+            result = await db.fetchone(
+                "INSERT INTO funcionarios (nome, funcao) VALUES (%s, %s) RETURNING id",
+                (funcionario.nome, funcionario.funcao.name)
+            )
+            print("📌 RESULTADO DO FETCH:", result)
 
-    try:
-        # ⬇️ AQUI É A LINHA CORRETA — usa .name que SEMPRE retorna 'LIDER'
-        cursor.execute(
-            "INSERT INTO funcionarios (nome, funcao) VALUES (%s, %s) RETURNING id",
-            (funcionario.nome, funcionario.funcao.name)
-        )
+            if not result:
+                raise Exception("INSERT não retornou id — possível erro de CHECK ou coluna inválida")
 
-        result = cursor.fetchone()
-        print("📌 RESULTADO DO FETCH:", result)
+            novo_id = result["id"]
 
-        if not result:
-            raise Exception("INSERT não retornou id — possível erro de CHECK ou coluna inválida")
+            await db.commit()
+            cache_funcionarios.invalidar_funcionarios(novo_id)
+            alteracao.funcionarios_ativos(1)
+            return {"message": "Funcionário cadastrado com sucesso", "id": novo_id}
 
-        novo_id = result[0] if isinstance(result, tuple) else result["id"]
-
-        conn.commit()
-        return {"message": "Funcionário cadastrado com sucesso", "id": novo_id}
-
-    except Exception as e:
-        conn.rollback()
-        print("🔥 ERRO REAL NO /funcionarios:", repr(e))
-        raise HTTPException(status_code=500, detail=f"Erro ao cadastrar funcionário: {str(e)}")
-
-    finally:
-        conn.close()
+        except Exception as e:
+            await db.rollback()
+            print("🔥 ERRO REAL NO /funcionarios:", repr(e))
+            raise HTTPException(status_code=500, detail=f"Erro ao cadastrar funcionário: {str(e)}")
 
 
 @router.get("/funcionarios")
-def listar_funcionarios(ativo: bool = True):
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    cursor.execute(
-        "SELECT id, nome, funcao, ativo, data_cadastro FROM funcionarios WHERE ativo=%s ORDER BY nome",
-        (ativo,)
-    )
-    funcionarios = cursor.fetchall()
-    conn.close()
-    return funcionarios
+async def listar_funcionarios(ativo: bool = True):
+    return await cache_funcionarios.listar_funcionarios(ativo)
 
 
 @router.get("/funcionarios/{funcionario_id}")
-def obter_funcionario(funcionario_id: int):
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    cursor.execute(
-        "SELECT id, nome, funcao, ativo, data_cadastro FROM funcionarios WHERE id=%s",
-        (funcionario_id,)
-    )
-    row = cursor.fetchone()
-    conn.close()
+async def obter_funcionario(funcionario_id: int):
+    row = await cache_funcionarios.obter_funcionario(funcionario_id)
 
     if not row:
         raise HTTPException(status_code=404, detail="Funcionário não encontrado")
@@ -74,7 +52,7 @@ def obter_funcionario(funcionario_id: int):
 
 
 @router.put("/funcionarios/{funcionario_id}")
-def atualizar_funcionario(funcionario_id: int, dados: FuncionarioUpdate):
+async def atualizar_funcionario(funcionario_id: int, dados: FuncionarioUpdate):
     updates = []
     values = []
 
@@ -96,64 +74,68 @@ def atualizar_funcionario(funcionario_id: int, dados: FuncionarioUpdate):
     values.append(funcionario_id)
     query = f"UPDATE funcionarios SET {', '.join(updates)} WHERE id=%s"
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    try:
-        cursor.execute(query, values)
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Funcionário não encontrado")
+    async with contadores_dashboard.alteracao() as alteracao, conexao() as db:
+        try:
+            # Situação anterior, para o contador de ativos do dashboard
+            anterior = await db.fetchone(
+                "SELECT ativo FROM funcionarios WHERE id=%s FOR NO KEY UPDATE", (funcionario_id,)
+            )
+            if not anterior:
+                raise HTTPException(status_code=404, detail="Funcionário não encontrado")
 
-        conn.commit()
-        return {"message": "Funcionário atualizado com sucesso"}
+            await db.execute(query, values)
+            await db.commit()
+            cache_funcionarios.invalidar_funcionarios(funcionario_id)
+            if dados.ativo is not None and dados.ativo != anterior['ativo']:
+                alteracao.funcionarios_ativos(1 if dados.ativo else -1)
+            return {"message": "Funcionário atualizado com sucesso"}
 
-    except Exception as e:
-        conn.rollback()
-        print("🔥 ERRO REAL AO ATUALIZAR FUNCIONARIO:", repr(e))
-        raise HTTPException(status_code=500, detail="Erro ao atualizar funcionário")
+        except HTTPException:
+            raise
 
-    finally:
-        conn.close()
+        except Exception as e:
+            await db.rollback()
+            print("🔥 ERRO REAL AO ATUALIZAR FUNCIONARIO:", repr(e))
+            raise HTTPException(status_code=500, detail="Erro ao atualizar funcionário")
 
 
 @router.delete("/funcionarios/{funcionario_id}")
-def excluir_funcionario(funcionario_id: int):
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    try:
-        # Verifica se funcionário existe
-        cursor.execute("SELECT id FROM funcionarios WHERE id = %s", (funcionario_id,))
-        resultado = cursor.fetchone()
-
-        if not resultado:
-            raise HTTPException(status_code=404, detail="Funcionário não encontrado")
-
-        # Conta ocorrências
-        cursor.execute("SELECT COUNT(*) as count FROM ocorrencias WHERE funcionario_id = %s", (funcionario_id,))
-        result_count = cursor.fetchone()
-        count_ocorrencias = result_count['count'] if result_count else 0
-
-        # Se tiver ocorrências → desativa
-        if count_ocorrencias > 0:
-            cursor2 = conn.cursor()
-            cursor2.execute("UPDATE funcionarios SET ativo = FALSE WHERE id = %s", (funcionario_id,))
-            conn.commit()
-            return {"message": "Funcionário desativado (possui ocorrências vinculadas)"}
-
-        # Se não tiver → exclui
-        cursor2 = conn.cursor()
-        cursor2.execute("DELETE FROM funcionarios WHERE id = %s", (funcionario_id,))
-        conn.commit()
-        return {"message": "Funcionário excluído com sucesso"}
-
-    except HTTPException:
-        raise
-
-    except Exception as e:
-        conn.rollback()
-        print("🔥 ERRO REAL NO DELETE FUNCIONARIO:", repr(e))
-        raise HTTPException(status_code=500, detail=f"Erro ao excluir funcionário: {str(e)}")
-
-    finally:
-        conn.close()
+async def excluir_funcionario(funcionario_id: int):
+    async with contadores_dashboard.alteracao() as alteracao, conexao() as db:
+        try:
+            # Verifica se funcionário existe
+            resultado = await db.fetchone("SELECT id, ativo FROM funcionarios WHERE id = %s FOR UPDATE", (funcionario_id,))
+
+            if not resultado:
+                raise HTTPException(status_code=404, detail="Funcionário não encontrado")
+
+            # Conta ocorrências
+            result_count = await db.fetchone(
+                "SELECT COUNT(*) as count FROM ocorrencias WHERE funcionario_id = %s", (funcionario_id,)
+            )
+            count_ocorrencias = result_count['count'] if result_count else 0
+
+            # Se tiver ocorrências → desativa
+            if count_ocorrencias > 0:
+                await db.execute("UPDATE funcionarios SET ativo = FALSE WHERE id = %s", (funcionario_id,))
+                await db.commit()
+                cache_funcionarios.invalidar_funcionarios(funcionario_id)
+                if resultado['ativo']:
+                    alteracao.funcionarios_ativos(-1)
+                return {"message": "Funcionário desativado (possui ocorrências vinculadas)"}
+
+            # Se não tiver → exclui
+            await db.execute("DELETE FROM funcionarios WHERE id = %s", (funcionario_id,))
+            await db.commit()
+            cache_funcionarios.invalidar_funcionarios(funcionario_id)
+            if resultado['ativo']:
+                alteracao.funcionarios_ativos(-1)
+            return {"message": "Funcionário excluído com sucesso"}
+
+        except HTTPException:
+            raise
+
+        except Exception as e:
+            await db.rollback()
+            print("🔥 ERRO REAL NO DELETE FUNCIONARIO:", repr(e))
+            raise HTTPException(status_code=500, detail=f"Erro ao excluir funcionário: {str(e)}")
@@ -1,141 +1,400 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional
-from app.database import get_db_connection
+from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+from typing import List, Optional
+from datetime import date, datetime
+import base64
+import csv
+import io
+import json
+from app import contadores_dashboard
+from app.database_async import ErroBanco, conexao
 from app.models import Ocorrencia
-from psycopg2.extras import RealDictCursor
+from app.regras import obter_regras
 
 router = APIRouter()
 
 
-@router.post("/ocorrencias")
-def registrar_ocorrencia(ocorrencia: Ocorrencia):
-    """Registra uma nova ocorrência"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    try:
-        # Verifica se funcionário existe
-        cursor.execute("SELECT 1 FROM funcionarios WHERE id = %s", (ocorrencia.funcionario_id,))
-        if not cursor.fetchone():
-            raise HTTPException(status_code=404, detail="Funcionário não encontrado")
-
-        # Verifica se tipo é válido
-        cursor.execute("SELECT 1 FROM regras_bonus WHERE tipo = %s", (ocorrencia.tipo,))
-        if not cursor.fetchone():
-            raise HTTPException(status_code=400, detail="Tipo de ocorrência inválido")
-
-        # Se for um atestado que anula uma ocorrência, verifica se a ocorrência existe
-        if ocorrencia.anula_ocorrencia_id:
-            cursor.execute("""
-                SELECT 1 FROM ocorrencias 
-                WHERE id = %s AND funcionario_id = %s AND tipo IN ('falta', 'atraso', 'saida_antecipada')
-            """, (ocorrencia.anula_ocorrencia_id, ocorrencia.funcionario_id))
-            if not cursor.fetchone():
-                raise HTTPException(
-                    status_code=400,
-                    detail="Ocorrência a ser anulada não encontrada ou tipo inválido para anulação"
-                )
-
-        cursor.execute("""
-            INSERT INTO ocorrencias (funcionario_id, tipo, data, observacao, anula_ocorrencia_id)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            ocorrencia.funcionario_id,
-            ocorrencia.tipo,
-            ocorrencia.data,
-            ocorrencia.observacao,
-            ocorrencia.anula_ocorrencia_id
-        ))
-
-        ocorrencia_id = cursor.fetchone()['id']
-        conn.commit()
-
-        return {"message": "Ocorrência registrada com sucesso", "id": ocorrencia_id}
-
-    finally:
-        conn.close()
+# Restrição violada no INSERT -> resposta da API
+ERROS_REGISTRO = {
+    "ocorrencias_funcionario_id_fkey": (404, "Funcionário não encontrado"),
+    "ocorrencias_tipo_fkey": (400, "Tipo de ocorrência inválido"),
+    "ocorrencias_anulacao_fkey": (400, "Ocorrência a ser anulada não encontrada ou tipo inválido para anulação"),
+}
 
 
 @router.post("/ocorrencias")
-def registrar_ocorrencia(ocorrencia: Ocorrencia):
+async def registrar_ocorrencia(ocorrencia: Ocorrencia):
     """Registra uma nova ocorrência"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    async with contadores_dashboard.alteracao() as alteracao, conexao() as db:
+        # Funcionário, tipo e ocorrência anulada são validados pelas
+        # restrições da tabela, no mesmo comando do INSERT
+        try:
+            row = await db.fetchone("""
+                INSERT INTO ocorrencias (funcionario_id, tipo, data, observacao, anula_ocorrencia_id)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING id, tipo, data
+            """, (
+                ocorrencia.funcionario_id,
+                ocorrencia.tipo,
+                ocorrencia.data,
+                ocorrencia.observacao,
+                ocorrencia.anula_ocorrencia_id
+            ))
+        except ErroBanco as e:
+            if e.constraint in ERROS_REGISTRO:
+                status_code, detail = ERROS_REGISTRO[e.constraint]
+                raise HTTPException(status_code=status_code, detail=detail)
+            if e.sqlstate in ("22007", "22008"):
+                raise HTTPException(status_code=400, detail="Data inválida")
+            raise
+        await db.commit()
+        alteracao.ocorrencias_incluidas([(row['tipo'], row['data'])])
+
+        return {"message": "Ocorrência registrada com sucesso", "id": row['id']}
+
+
+COLUNAS_IMPORTACAO = ["funcionario_id", "tipo", "data", "observacao", "anula_ocorrencia_id"]
+
+
+def _ler_data(texto):
+    """Aceita YYYY-MM-DD ou DD/MM/YYYY"""
+    if "/" in texto:
+        return datetime.strptime(texto, "%d/%m/%Y").date()
+    return date.fromisoformat(texto)
+
+
+# Faixa de um INTEGER do PostgreSQL; fora dela o COPY falharia para o arquivo todo
+MAIOR_ID = 2**31 - 1
+
+
+def _id_valido(valor):
+    """Id positivo que cabe em INTEGER"""
+    return 1 <= valor <= MAIOR_ID
+
+
+def _ler_id(texto):
+    """Id positivo que cabe em INTEGER; ValueError caso contrário"""
+    valor = int(texto)
+    if not _id_valido(valor):
+        raise ValueError(texto)
+    return valor
+
+
+def _decodificar_csv(conteudo):
+    """UTF-8 (com ou sem BOM) ou, como fazem muitos relógios de ponto, Windows-1252"""
+    for codificacao in ("utf-8-sig", "cp1252"):
+        try:
+            return conteudo.decode(codificacao)
+        except UnicodeDecodeError:
+            continue
+    raise HTTPException(status_code=400, detail="Codificação do CSV não reconhecida (use UTF-8 ou Windows-1252)")
+
+
+def _ler_csv_ocorrencias(conteudo):
+    """Lê o CSV de importação e separa linhas bem formadas das rejeitadas.
+
+    Retorna (validas, rejeitadas); `validas` são tuplas prontas para o COPY,
+    com o número da linha do arquivo na primeira posição.
+    """
+    texto = _decodificar_csv(conteudo)
+    primeira_linha = texto.split("\n", 1)[0]
+    delimitador = ";" if primeira_linha.count(";") > primeira_linha.count(",") else ","
+    leitor = csv.DictReader(io.StringIO(texto), delimiter=delimitador)
+
+    faltando = [coluna for coluna in ("funcionario_id", "tipo", "data") if coluna not in (leitor.fieldnames or [])]
+    if faltando:
+        raise HTTPException(status_code=400, detail=f"Colunas obrigatórias ausentes no CSV: {', '.join(faltando)}")
+
+    validas = []
+    rejeitadas = []
+    for numero, row in enumerate(leitor, start=2):
+        dados = {coluna: (row.get(coluna) or "").strip() for coluna in COLUNAS_IMPORTACAO}
+        try:
+            funcionario_id = _ler_id(dados["funcionario_id"])
+        except ValueError:
+            rejeitadas.append({"linha": numero, "motivo": "funcionario_id inválido", "dados": dados})
+            continue
+        try:
+            data = _ler_data(dados["data"])
+        except ValueError:
+            rejeitadas.append({"linha": numero, "motivo": "Data inválida", "dados": dados})
+            continue
+        try:
+            anula = _ler_id(dados["anula_ocorrencia_id"]) if dados["anula_ocorrencia_id"] else None
+        except ValueError:
+            rejeitadas.append({"linha": numero, "motivo": "anula_ocorrencia_id inválido", "dados": dados})
+            continue
+
+        validas.append((numero, funcionario_id, dados["tipo"], data, dados["observacao"] or None, anula))
+
+    return validas, rejeitadas
+
+
+@router.post("/ocorrencias/importar")
+async def importar_ocorrencias(arquivo: UploadFile = File(..., description="CSV com funcionario_id, tipo, data, observacao, anula_ocorrencia_id")):
+    """Importa ocorrências em lote a partir de um CSV (ex.: exportação do relógio de ponto)"""
+    validas, rejeitadas = _ler_csv_ocorrencias(await arquivo.read())
+
+    importadas = 0
+    if validas:
+        async with contadores_dashboard.alteracao() as alteracao, conexao() as db:
+            # Tabela de preparação descartada ao fim da transação
+            await db.execute("""
+                CREATE TEMP TABLE importacao_ocorrencias (
+                    linha INTEGER NOT NULL,
+                    funcionario_id INTEGER NOT NULL,
+                    tipo TEXT NOT NULL,
+                    data DATE NOT NULL,
+                    observacao TEXT,
+                    anula_ocorrencia_id INTEGER,
+                    motivo TEXT
+                ) ON COMMIT DROP
+            """)
+            await db.copiar(
+                "importacao_ocorrencias",
+                ["linha", "funcionario_id", "tipo", "data", "observacao", "anula_ocorrencia_id"],
+                validas
+            )
 
+            # Validação em conjunto: uma única passada sobre todas as linhas
+            await db.execute("""
+                UPDATE importacao_ocorrencias s SET motivo = CASE
+                    WHEN NOT EXISTS (SELECT 1 FROM funcionarios f WHERE f.id = s.funcionario_id)
+                        THEN 'Funcionário não encontrado'
+                    WHEN NOT EXISTS (SELECT 1 FROM regras_bonus r WHERE r.tipo = s.tipo)
+                        THEN 'Tipo de ocorrência inválido'
+                    WHEN s.anula_ocorrencia_id IS NOT NULL AND NOT EXISTS (
+                        SELECT 1 FROM ocorrencias o
+                        WHERE o.id = s.anula_ocorrencia_id
+                        AND o.funcionario_id = s.funcionario_id
+                        AND o.tipo IN ('falta', 'atraso', 'saida_antecipada')
+                    ) THEN 'Ocorrência a ser anulada não encontrada ou tipo inválido para anulação'
+                END
+            """)
+
+            incluidas = await db.fetchall("""
+                INSERT INTO ocorrencias (funcionario_id, tipo, data, observacao, anula_ocorrencia_id)
+                SELECT funcionario_id, tipo, data, observacao, anula_ocorrencia_id
+                FROM importacao_ocorrencias
+                WHERE motivo IS NULL
+                ORDER BY linha
+                RETURNING tipo, data
+            """)
+            importadas = len(incluidas)
+
+            invalidas = await db.fetchall("""
+                SELECT linha, motivo, funcionario_id, tipo, data, observacao, anula_ocorrencia_id
+                FROM importacao_ocorrencias
+                WHERE motivo IS NOT NULL
+            """)
+            await db.commit()
+            alteracao.ocorrencias_incluidas((row['tipo'], row['data']) for row in incluidas)
+
+        for row in invalidas:
+            rejeitadas.append({
+                "linha": row['linha'],
+                "motivo": row['motivo'],
+                "dados": {coluna: row[coluna] for coluna in COLUNAS_IMPORTACAO}
+            })
+
+    rejeitadas.sort(key=lambda r: r['linha'])
+    return {
+        "message": f"{importadas} ocorrência(s) importada(s), {len(rejeitadas)} rejeitada(s)",
+        "importadas": importadas,
+        "rejeitadas": rejeitadas
+    }
+
+
+LIMITE_LOTE = 1000
+
+
+@router.post("/ocorrencias/batch")
+async def registrar_ocorrencias_lote(
+    ocorrencias: List[Ocorrencia],
+    modo: str = Query("tudo_ou_nada", description="tudo_ou_nada: grava só se todas forem válidas; parcial: grava as válidas")
+):
+    """Registra várias ocorrências em uma única requisição (ex.: fechamento de turno)"""
+    if modo not in ("tudo_ou_nada", "parcial"):
+        raise HTTPException(status_code=400, detail="Modo inválido. Use 'tudo_ou_nada' ou 'parcial'")
+    if not ocorrencias:
+        raise HTTPException(status_code=400, detail="Nenhuma ocorrência enviada")
+    if len(ocorrencias) > LIMITE_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo de {LIMITE_LOTE} ocorrências por lote")
+
+    regras = (await obter_regras()).por_tipo
+
+    async with contadores_dashboard.alteracao() as alteracao, conexao() as db:
+        # Mesmas validações de registrar_ocorrencia, mas uma consulta para o
+        # lote todo; ids fora de INTEGER não existem e ficam fora da consulta
+        funcionarios = {row['id'] for row in await db.fetchall(
+            "SELECT id FROM funcionarios WHERE id = ANY(%s::int[])",
+            (list({o.funcionario_id for o in ocorrencias if _id_valido(o.funcionario_id)}),)
+        )}
+        alvos = list({
+            o.anula_ocorrencia_id for o in ocorrencias
+            if o.anula_ocorrencia_id and _id_valido(o.anula_ocorrencia_id)
+        })
+        anulaveis = {
+            (row['id'], row['funcionario_id']) for row in await db.fetchall("""
+                SELECT id, funcionario_id FROM ocorrencias
+                WHERE id = ANY(%s::int[]) AND tipo IN ('falta', 'atraso', 'saida_antecipada')
+            """, (alvos,))
+        } if alvos else set()
+
+        resultados = []
+        validas = []
+        for indice, ocorrencia in enumerate(ocorrencias):
+            erro = None
+            if ocorrencia.funcionario_id not in funcionarios:
+                erro = {"status": 404, "detail": "Funcionário não encontrado"}
+            elif ocorrencia.tipo not in regras:
+                erro = {"status": 400, "detail": "Tipo de ocorrência inválido"}
+            elif ocorrencia.anula_ocorrencia_id and \
+                    (ocorrencia.anula_ocorrencia_id, ocorrencia.funcionario_id) not in anulaveis:
+                erro = {"status": 400, "detail": "Ocorrência a ser anulada não encontrada ou tipo inválido para anulação"}
+            else:
+                try:
+                    data = date.fromisoformat(ocorrencia.data)
+                except ValueError:
+                    erro = {"status": 400, "detail": "Data inválida"}
+                else:
+                    validas.append((indice, ocorrencia, data))
+            resultados.append({"indice": indice, "id": None, "erro": erro})
+
+        invalidas = len(ocorrencias) - len(validas)
+        if invalidas and modo == "tudo_ou_nada":
+            raise HTTPException(status_code=400, detail={
+                "message": f"Nenhuma ocorrência registrada: {invalidas} inválida(s)",
+                "resultados": resultados
+            })
+
+        gravadas = []
+        if validas:
+            # Reserva os ids antes, assim cada id volta para o item certo
+            ids = [row['id'] for row in await db.fetchall(
+                "SELECT nextval(pg_get_serial_sequence('ocorrencias', 'id')) AS id FROM generate_series(1, %s)",
+                (len(validas),)
+            )]
+            try:
+                await db.execute("""
+                    INSERT INTO ocorrencias (id, funcionario_id, tipo, data, observacao, anula_ocorrencia_id)
+                    SELECT * FROM unnest(%s::int[], %s::int[], %s::text[], %s::date[], %s::text[], %s::int[])
+                """, (
+                    ids,
+                    [o.funcionario_id for _, o, _ in validas],
+                    [o.tipo for _, o, _ in validas],
+                    [data for _, _, data in validas],
+                    [o.observacao for _, o, _ in validas],
+                    [o.anula_ocorrencia_id for _, o, _ in validas],
+                ))
+                gravadas = list(zip(validas, ids))
+            except ErroBanco as e:
+                # A validação acima usa o cache de regras e pode ter corrido
+                # antes de uma exclusão em outro processo
+                await db.rollback()
+                if e.constraint not in ERROS_REGISTRO:
+                    raise
+                if modo == "tudo_ou_nada":
+                    status_code, detail = ERROS_REGISTRO[e.constraint]
+                    raise HTTPException(status_code=status_code, detail=detail)
+                gravadas = await _inserir_por_item(db, validas, ids, resultados)
+
+            await db.commit()
+            alteracao.ocorrencias_incluidas((o.tipo, data) for (_, o, data), _ in gravadas)
+            for (indice, _, _), id_ in gravadas:
+                resultados[indice]["id"] = id_
+
+    rejeitadas = len(ocorrencias) - len(gravadas)
+    return {
+        "message": f"{len(gravadas)} ocorrência(s) registrada(s), {rejeitadas} rejeitada(s)",
+        "registradas": len(gravadas),
+        "rejeitadas": rejeitadas,
+        "resultados": resultados
+    }
+
+
+async def _inserir_por_item(db, validas, ids, resultados):
+    """Grava item a item, cada um em um savepoint, marcando nos resultados os
+    que as restrições da tabela recusarem; retorna os pares (item, id) gravados"""
+    gravadas = []
+    for (indice, ocorrencia, data), id_ in zip(validas, ids):
+        await db.execute("SAVEPOINT item_lote")
+        try:
+            await db.execute("""
+                INSERT INTO ocorrencias (id, funcionario_id, tipo, data, observacao, anula_ocorrencia_id)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (id_, ocorrencia.funcionario_id, ocorrencia.tipo, data,
+                  ocorrencia.observacao, ocorrencia.anula_ocorrencia_id))
+        except ErroBanco as e:
+            if e.constraint not in ERROS_REGISTRO:
+                raise
+            await db.execute("ROLLBACK TO SAVEPOINT item_lote")
+            status_code, detail = ERROS_REGISTRO[e.constraint]
+            resultados[indice]["erro"] = {"status": status_code, "detail": detail}
+            continue
+        await db.execute("RELEASE SAVEPOINT item_lote")
+        gravadas.append(((indice, ocorrencia, data), id_))
+    return gravadas
+
+
+# Campos disponíveis para projeção em GET /ocorrencias (campo -> colunas SQL)
+CAMPOS_OCORRENCIA = {
+    "id": "o.id",
+    "funcionario_id": "o.funcionario_id",
+    "nome_funcionario": "f.nome as nome_funcionario",
+    "tipo": "o.tipo",
+    "data": "o.data",
+    "observacao": "o.observacao",
+    "anula_ocorrencia_id": "o.anula_ocorrencia_id",
+    "registrado_em": "o.registrado_em",
+    "ocorrencia_anulada": "o_anulada.tipo as tipo_anulada, o_anulada.data as data_anulada",
+}
+
+
+def _codificar_cursor(row):
+    chave = [row['data'].isoformat(), row['registrado_em'].isoformat(), row['id']]
+    return base64.urlsafe_b64encode(json.dumps(chave).encode()).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor_token):
     try:
-        # Verifica se funcionário existe
-        cursor.execute("SELECT 1 FROM funcionarios WHERE id = %s", (ocorrencia.funcionario_id,))
-        if not cursor.fetchone():
-            raise HTTPException(status_code=404, detail="Funcionário não encontrado")
-
-        # Verifica se tipo é válido
-        cursor.execute("SELECT 1 FROM regras_bonus WHERE tipo = %s", (ocorrencia.tipo,))
-        if not cursor.fetchone():
-            raise HTTPException(status_code=400, detail="Tipo de ocorrência inválido")
-
-        # Se for um atestado que anula uma ocorrência, verifica se a ocorrência existe
-        if ocorrencia.anula_ocorrencia_id:
-            cursor.execute("""
-                SELECT 1 FROM ocorrencias 
-                WHERE id = %s AND funcionario_id = %s AND tipo IN ('falta', 'atraso', 'saida_antecipada')
-            """, (ocorrencia.anula_ocorrencia_id, ocorrencia.funcionario_id))
-            if not cursor.fetchone():
-                raise HTTPException(
-                    status_code=400,
-                    detail="Ocorrência a ser anulada não encontrada ou tipo inválido para anulação"
-                )
-
-        cursor.execute("""
-            INSERT INTO ocorrencias (funcionario_id, tipo, data, observacao, anula_ocorrencia_id)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            ocorrencia.funcionario_id,
-            ocorrencia.tipo,
-            ocorrencia.data,
-            ocorrencia.observacao,
-            ocorrencia.anula_ocorrencia_id
-        ))
-
-        ocorrencia_id = cursor.fetchone()['id']
-        conn.commit()
-
-        return {"message": "Ocorrência registrada com sucesso", "id": ocorrencia_id}
-
-    finally:
-        conn.close()
+        preenchimento = "=" * (-len(cursor_token) % 4)
+        data, registrado_em, ocorrencia_id = json.loads(base64.urlsafe_b64decode(cursor_token + preenchimento))
+        return date.fromisoformat(data), datetime.fromisoformat(registrado_em), int(ocorrencia_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
 
 
 @router.get("/ocorrencias")
-def listar_ocorrencias(
+async def listar_ocorrencias(
     funcionario_id: Optional[str] = None,
     data_inicio: Optional[str] = None,
     data_fim: Optional[str] = None,
-    tipo: Optional[str] = None
+    tipo: Optional[str] = None,
+    limite: int = Query(100, ge=1, le=1000, description="Itens por página"),
+    cursor: Optional[str] = Query(None, description="Valor de proximo_cursor da página anterior"),
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula (ex.: id,data,tipo)")
 ):
-    """Lista ocorrências com filtros opcionais"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    # CORREÇÃO: Removi os comentários HTML da query SQL
-    query = """
-        SELECT 
-            o.id, 
-            o.funcionario_id, 
-            f.nome as nome_funcionario,
-            o.tipo, 
-            o.data, 
-            o.observacao, 
-            o.anula_ocorrencia_id,
-            o.registrado_em,
-            o_anulada.tipo as tipo_anulada,
-            o_anulada.data as data_anulada
-        FROM ocorrencias o
-        JOIN funcionarios f ON o.funcionario_id = f.id
-        LEFT JOIN ocorrencias o_anulada ON o.anula_ocorrencia_id = o_anulada.id
-        WHERE 1=1
-    """
+    """Lista ocorrências com filtros opcionais, paginadas por (data, registrado_em, id)"""
+    if fields:
+        campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+        invalidos = [campo for campo in campos if campo not in CAMPOS_OCORRENCIA]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(invalidos)}")
+    else:
+        campos = list(CAMPOS_OCORRENCIA)
+
+    # A chave de paginação é sempre lida, mesmo que não faça parte da projeção
+    colunas = ["o.id", "o.data", "o.registrado_em"]
+    colunas += [CAMPOS_OCORRENCIA[campo] for campo in campos if campo not in ("id", "data", "registrado_em")]
+    if "ocorrencia_anulada" in campos and "anula_ocorrencia_id" not in campos:
+        colunas.append("o.anula_ocorrencia_id")
+
+    query = f"SELECT {', '.join(colunas)} FROM ocorrencias o"
+    if "nome_funcionario" in campos:
+        query += " JOIN funcionarios f ON o.funcionario_id = f.id"
+    if "ocorrencia_anulada" in campos:
+        query += " LEFT JOIN ocorrencias o_anulada ON o.anula_ocorrencia_id = o_anulada.id"
+    query += " WHERE 1=1"
     params = []
 
     if funcionario_id:
@@ -150,118 +409,75 @@ def listar_ocorrencias(
     if tipo:
         query += " AND o.tipo = %s"
         params.append(tipo)
+    if cursor:
+        query += " AND (o.data, o.registrado_em, o.id) < (%s, %s, %s)"
+        params.extend(_decodificar_cursor(cursor))
 
-    query += " ORDER BY o.data DESC, o.registrado_em DESC"
+    # Busca um item a mais para saber se existe próxima página
+    query += " ORDER BY o.data DESC, o.registrado_em DESC, o.id DESC LIMIT %s"
+    params.append(limite + 1)
 
-    cursor.execute(query, params)
-    ocorrencias = []
+    async with conexao() as db:
+        rows = await db.fetchall(query, params)
+
+    proximo_cursor = None
+    if len(rows) > limite:
+        rows = rows[:limite]
+        proximo_cursor = _codificar_cursor(rows[-1])
 
-    for row in cursor.fetchall():
-        ocorrencia = dict(row)
-        if row['anula_ocorrencia_id']:
+    ocorrencias = []
+    for row in rows:
+        if fields:
+            ocorrencia = {campo: row[campo] for campo in campos if campo != "ocorrencia_anulada"}
+        else:
+            ocorrencia = dict(row)
+        if "ocorrencia_anulada" in campos and row['anula_ocorrencia_id']:
             ocorrencia["ocorrencia_anulada"] = {
                 "tipo": row['tipo_anulada'],
                 "data": row['data_anulada']
             }
         ocorrencias.append(ocorrencia)
 
-    conn.close()
-    return ocorrencias
+    return {"itens": ocorrencias, "proximo_cursor": proximo_cursor}
 
 
 @router.get("/ocorrencias/{funcionario_id}/pendentes")
-def listar_ocorrencias_pendentes_anulacao(funcionario_id: str):
+async def listar_ocorrencias_pendentes_anulacao(funcionario_id: str):
     """Lista ocorrências que podem ser anuladas por atestado (falta, atraso, saida_antecipada)"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    cursor.execute("""
+    async with conexao() as db:
+        return await db.fetchall("""
         SELECT o.id, o.tipo, o.data, o.observacao
         FROM ocorrencias o
         WHERE o.funcionario_id = %s
-        AND o.tipo IN ('falta', 'atraso', 'saida_antecipada')
-        AND o.id NOT IN (
-            SELECT anula_ocorrencia_id 
-            FROM ocorrencias 
-            WHERE anula_ocorrencia_id IS NOT NULL
-        )
+        AND o.anulavel AND NOT o.anulada
         ORDER BY o.data DESC
     """, (funcionario_id,))
 
-    pendentes = cursor.fetchall()
-    conn.close()
-    return pendentes
-
 
 @router.delete("/ocorrencias/{ocorrencia_id}")
-def deletar_ocorrencia(ocorrencia_id: int):
+async def deletar_ocorrencia(ocorrencia_id: int):
     """Deleta uma ocorrência"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    try:
-        # Verifica se a ocorrência está sendo usada em algum atestado
-        cursor.execute("SELECT 1 FROM ocorrencias WHERE anula_ocorrencia_id = %s", (ocorrencia_id,))
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=400,
-                detail="Não é possível deletar esta ocorrência pois ela está vinculada a um atestado"
+    async with contadores_dashboard.alteracao() as alteracao, conexao() as db:
+        # Ocorrência anulada por atestado não pode ser excluída; a FK da
+        # anulação cobre o caso de um atestado gravado ao mesmo tempo
+        try:
+            excluida = await db.fetchone(
+                "DELETE FROM ocorrencias WHERE id = %s AND NOT anulada RETURNING tipo, data", (ocorrencia_id,)
             )
-
-        cursor.execute("DELETE FROM ocorrencias WHERE id = %s", (ocorrencia_id,))
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Ocorrência não encontrada")
-        conn.commit()
-        return {"message": "Ocorrência deletada com sucesso"}
-
-    finally:
-        conn.close()
-
-
-@router.get("/ocorrencias/{funcionario_id}/pendentes")
-def listar_ocorrencias_pendentes_anulacao(funcionario_id: str):
-    """Lista ocorrências que podem ser anuladas por atestado (falta, atraso, saida_antecipada)"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    cursor.execute("""
-        SELECT o.id, o.tipo, o.data, o.observacao
-        FROM ocorrencias o
-        WHERE o.funcionario_id = %s
-        AND o.tipo IN ('falta', 'atraso', 'saida_antecipada')
-        AND o.id NOT IN (
-            SELECT anula_ocorrencia_id 
-            FROM ocorrencias 
-            WHERE anula_ocorrencia_id IS NOT NULL
-        )
-        ORDER BY o.data DESC
-    """, (funcionario_id,))
-
-    pendentes = cursor.fetchall()
-    conn.close()
-    return pendentes
-
-
-@router.delete("/ocorrencias/{ocorrencia_id}")
-def deletar_ocorrencia(ocorrencia_id: int):
-    """Deleta uma ocorrência"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    try:
-        # Verifica se a ocorrência está sendo usada em algum atestado
-        cursor.execute("SELECT 1 FROM ocorrencias WHERE anula_ocorrencia_id = %s", (ocorrencia_id,))
-        if cursor.fetchone():
+            if not excluida and not await db.fetchone(
+                "SELECT 1 FROM ocorrencias WHERE id = %s", (ocorrencia_id,)
+            ):
+                raise HTTPException(status_code=404, detail="Ocorrência não encontrada")
+        except ErroBanco as e:
+            if e.constraint != "ocorrencias_anulacao_fkey":
+                raise
+            excluida = None
+
+        if not excluida:
             raise HTTPException(
                 status_code=400,
                 detail="Não é possível deletar esta ocorrência pois ela está vinculada a um atestado"
             )
-
-        cursor.execute("DELETE FROM ocorrencias WHERE id = %s", (ocorrencia_id,))
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Ocorrência não encontrada")
-        conn.commit()
+        await db.commit()
+        alteracao.ocorrencias_excluidas([(excluida['tipo'], excluida['data'])])
         return {"message": "Ocorrência deletada com sucesso"}
-
-    finally:
-        conn.close()
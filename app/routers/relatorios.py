@@ -1,9 +1,19 @@
-from fastapi import APIRouter, HTTPException, Query
-from app.database import get_db_connection
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.database_async import ErroBanco, conexao
+from app.bonus import avaliar_bonus, avaliar_bonus_totais, dividir_periodo, iterar_bonus_lote, iterar_tendencia
+from app.bonus_vetorizado import simular_regras
+from app import cache_relatorios
+from app.agregados_relatorio import ResultadosCompactos, agregar_fechamento, agregar_resultados
+from app.fechamentos import buscar_fechamento, iterar_fechamento
+from app.regras import Regra, obter_regras, invalidar_regras
 from app.models import PeriodoRelatorio
-from psycopg2.extras import RealDictCursor
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from datetime import date, timedelta
+import csv
+import io
+import json
 
 router = APIRouter()
 
@@ -20,193 +30,117 @@ class RegraBonusUpdate(BaseModel):
     limite: Optional[int] = None
     descricao: Optional[str] = None
 
+class SimulacaoRegras(BaseModel):
+    data_inicio: str
+    data_fim: str
+    regras: List[RegraBonus] = []
+    remover: List[str] = []
 
-def calcular_bonus_funcionario(funcionario_id: str, data_inicio: str, data_fim: str):
+class TendenciaRelatorio(BaseModel):
+    data_inicio: str
+    data_fim: str
+    granularidade: str = "mes"
+
+# Evita respostas gigantes (ex.: dez anos por semana)
+LIMITE_FAIXAS_TENDENCIA = 120
+
+
+def _meses_inteiros(data_inicio: str, data_fim: str):
+    """(primeiro mês, último mês) se o período cobre apenas meses inteiros"""
+    try:
+        inicio = date.fromisoformat(data_inicio)
+        fim = date.fromisoformat(data_fim)
+    except ValueError:
+        return None
+    if inicio.day != 1 or (fim + timedelta(days=1)).day != 1 or fim < inicio:
+        return None
+    return inicio, fim.replace(day=1)
+
+
+async def calcular_bonus_funcionario(funcionario_id: str, data_inicio: str, data_fim: str):
     """Calcula o bônus de um funcionário em um período"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    regras = (await obter_regras()).por_tipo
 
     try:
-        # Busca funcionário
-        cursor.execute("SELECT nome FROM funcionarios WHERE id = %s", (funcionario_id,))
-        func = cursor.fetchone()
-        if not func:
-            return None
-
-        # Busca ocorrências do período, incluindo anulações
-        cursor.execute("""
+        int(funcionario_id)
+    except ValueError:
+        return None
+
+    # O nome vem nas mesmas consultas dos dados, e não do cache de cadastros:
+    # a resposta fica no cache de relatórios sob a marca d'água do banco, que
+    # não percebe um cache de cadastros ainda sem o aviso de uma alteração
+    async with conexao() as db:
+        # Meses inteiros: lê os totais mensais mantidos pelos triggers
+        meses = _meses_inteiros(data_inicio, data_fim)
+        if meses:
+            linhas = await db.fetchall("""
+                SELECT f.nome, t.tipo, t.quantidade, t.primeira_data, t.primeiro_id, t.anulacoes, t.anulacoes_outro_mes
+                FROM funcionarios f
+                LEFT JOIN totais_mensais t
+                    ON t.funcionario_id = f.id AND t.mes >= %s AND t.mes <= %s
+                WHERE f.id = %s
+            """, (meses[0], meses[1], funcionario_id))
+            if not linhas:
+                return None
+            totais = [total for total in linhas if total['tipo'] is not None]
+            if not any(total['anulacoes_outro_mes'] for total in totais):
+                return avaliar_bonus_totais(funcionario_id, linhas[0]['nome'], totais, regras)
+
+        # Busca ocorrências do período; a anulação é resolvida pelos atestados
+        # do próprio período, sem voltar à tabela para cada ocorrência anulada
+        linhas = await db.fetchall("""
             SELECT 
+                f.nome,
                 o.id,
                 o.tipo,
-                o.anula_ocorrencia_id,
-                o_anulada.tipo as tipo_anulada
-            FROM ocorrencias o
-            LEFT JOIN ocorrencias o_anulada ON o.anula_ocorrencia_id = o_anulada.id
-            WHERE o.funcionario_id = %s AND o.data >= %s AND o.data <= %s
-            ORDER BY o.data
-        """, (funcionario_id, data_inicio, data_fim))
-        ocorrencias_raw = cursor.fetchall()
-
-        # Busca regras de bônus
-        cursor.execute("SELECT tipo, categoria, desconto, limite FROM regras_bonus")
-        regras = {row['tipo']: {"categoria": row['categoria'], "desconto": row['desconto'], "limite": row['limite']}
-                  for row in cursor.fetchall()}
-
-    finally:
-        conn.close()
-
-    # Processa ocorrências considerando anulações
-    ocorrencias_efetivas = []
-    ocorrencias_anuladas = set()
-
-    # Identifica ocorrências que foram anuladas
-    for row in ocorrencias_raw:
-        if row['anula_ocorrencia_id']:
-            ocorrencias_anuladas.add(row['anula_ocorrencia_id'])
-
-    # Processa ocorrências não anuladas
-    for row in ocorrencias_raw:
-        if row['id'] in ocorrencias_anuladas:
-            continue
-        if row['anula_ocorrencia_id']:
-            ocorrencias_efetivas.append('atestado')
-        else:
-            ocorrencias_efetivas.append(row['tipo'])
-
-    bonus_final = 100.0
-    detalhes = []
-    perdeu_bonus = False
-    bonus_positivos = 0.0
-
-    # Contadores automáticos para todas as regras com limite
-    contadores = {}
-    for ocorrencia in ocorrencias_efetivas:
-        contadores[ocorrencia] = contadores.get(ocorrencia, 0) + 1
-
-    # Processa cada tipo de ocorrência apenas uma vez
-    tipos_processados = set()
-    
-    for ocorrencia in ocorrencias_efetivas:
-        if ocorrencia in tipos_processados:
-            continue
-            
-        regra = regras.get(ocorrencia)
-        if not regra:
-            continue
-
-        categoria = regra['categoria']
-        desconto = regra['desconto']
-        limite = regra.get('limite')
-        quantidade = contadores.get(ocorrencia, 0)
-
-        if categoria == 'elimina':
-            perdeu_bonus = True
-            detalhes.append({"tipo": ocorrencia, "impacto": "Elimina bônus", "desconto": 100})
-        elif categoria == 'limite' and ocorrencia == 'atestado':
-            if quantidade > limite:
-                perdeu_bonus = True
-                detalhes.append({
-                    "tipo": ocorrencia,
-                    "impacto": f"Excedeu limite de {limite} atestados ({quantidade})",
-                    "desconto": 100
-                })
-        elif categoria == 'percentual' and not perdeu_bonus:
-            # Aplica desconto para cada ocorrência (sem limite)
-            total_desconto = desconto * quantidade
-            bonus_final -= total_desconto
-            detalhes.append({
-                "tipo": ocorrencia, 
-                "impacto": f"Reduz {total_desconto}% ({quantidade} ocorrência(s))", 
-                "desconto": total_desconto
-            })
-        elif categoria == 'bonus' and not perdeu_bonus:
-            # Verifica limite para supermetas
-            if limite is not None:
-                # Aplica apenas até o limite permitido
-                quantidade_aplicavel = min(quantidade, limite)
-                bonus_aplicavel = desconto * quantidade_aplicavel
-                if quantidade_aplicavel > 0:
-                    bonus_positivos += bonus_aplicavel
-                    detalhes.append({
-                        "tipo": ocorrencia, 
-                        "impacto": f"Adiciona {bonus_aplicavel}% ({quantidade_aplicavel} de {quantidade} dentro do limite)", 
-                        "desconto": bonus_aplicavel
-                    })
-            else:
-                # Sem limite, aplica todas as ocorrências
-                bonus_aplicavel = desconto * quantidade
-                bonus_positivos += bonus_aplicavel
-                detalhes.append({
-                    "tipo": ocorrencia, 
-                    "impacto": f"Adiciona {bonus_aplicavel}% ({quantidade} ocorrência(s))", 
-                    "desconto": bonus_aplicavel
-                })
-
-        tipos_processados.add(ocorrencia)
-
-    if perdeu_bonus:
-        bonus_final = 0
-    else:
-        # Aplica bônus positivos (não pode ultrapassar 200%)
-        bonus_final = min(200, bonus_final + bonus_positivos)
-        bonus_final = max(0, bonus_final)
+                o.anula_ocorrencia_id
+            FROM funcionarios f
+            LEFT JOIN ocorrencias o
+                ON o.funcionario_id = f.id AND o.data >= %s AND o.data <= %s
+            WHERE f.id = %s
+            ORDER BY o.data, o.id
+        """, (data_inicio, data_fim, funcionario_id))
+    if not linhas:
+        return None
 
-    return {
-        "funcionario_id": funcionario_id,
-        "nome": func['nome'],
-        "bonus_percentual": round(bonus_final, 2),
-        "recebe_bonus": bonus_final > 0,
-        "total_ocorrencias": len(ocorrencias_efetivas),
-        "atestados": contadores.get('atestado', 0),
-        "detalhes": detalhes,
-        "ocorrencias_anuladas": len(ocorrencias_anuladas),
-        "bonus_positivos": round(bonus_positivos, 2)
-    }
+    ocorrencias_raw = [row for row in linhas if row['id'] is not None]
+    return avaliar_bonus(funcionario_id, linhas[0]['nome'], ocorrencias_raw, regras)
 
 
 @router.get("/regras")
-def listar_regras():
+async def listar_regras():
     """Lista todas as regras de bonificação"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-    try:
-        cursor.execute("SELECT tipo, categoria, desconto, limite, descricao FROM regras_bonus ORDER BY tipo")
-        return cursor.fetchall()
-    finally:
-        conn.close()
+    async with conexao() as db:
+        return await db.fetchall("SELECT tipo, categoria, desconto, limite, descricao FROM regras_bonus ORDER BY tipo")
 
 
 @router.post("/regras")
-def criar_regra(regra: RegraBonus):
+async def criar_regra(regra: RegraBonus):
     """Cria uma nova regra de bonificação"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("""
-            INSERT INTO regras_bonus (tipo, categoria, desconto, limite, descricao)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (
-            regra.tipo,
-            regra.categoria,
-            regra.desconto,
-            regra.limite,
-            regra.descricao
-        ))
-        conn.commit()
-        return {"message": "Regra criada com sucesso"}
-    except Exception as e:
-        conn.rollback()
-        if "duplicate key" in str(e).lower():
-            raise HTTPException(status_code=400, detail="Já existe uma regra com este tipo")
-        raise HTTPException(status_code=500, detail=f"Erro ao criar regra: {str(e)}")
-    finally:
-        conn.close()
+    async with conexao() as db:
+        try:
+            await db.execute("""
+                INSERT INTO regras_bonus (tipo, categoria, desconto, limite, descricao)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (
+                regra.tipo,
+                regra.categoria,
+                regra.desconto,
+                regra.limite,
+                regra.descricao
+            ))
+            await db.commit()
+            invalidar_regras()
+            return {"message": "Regra criada com sucesso"}
+        except Exception as e:
+            await db.rollback()
+            if "duplicate key" in str(e).lower():
+                raise HTTPException(status_code=400, detail="Já existe uma regra com este tipo")
+            raise HTTPException(status_code=500, detail=f"Erro ao criar regra: {str(e)}")
 
 
 @router.put("/regras/{tipo_regra}")
-def atualizar_regra(tipo_regra: str, dados: RegraBonusUpdate):
+async def atualizar_regra(tipo_regra: str, dados: RegraBonusUpdate):
     """Atualiza uma regra de bonificação"""
     updates = []
     values = []
@@ -230,73 +164,333 @@ def atualizar_regra(tipo_regra: str, dados: RegraBonusUpdate):
     values.append(tipo_regra)
     query = f"UPDATE regras_bonus SET {', '.join(updates)} WHERE tipo=%s"
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute(query, values)
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Regra não encontrada")
-        conn.commit()
-        return {"message": "Regra atualizada com sucesso"}
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=f"Erro ao atualizar regra: {str(e)}")
-    finally:
-        conn.close()
+    async with conexao() as db:
+        try:
+            if await db.execute(query, values) == 0:
+                raise HTTPException(status_code=404, detail="Regra não encontrada")
+            await db.commit()
+            invalidar_regras()
+            return {"message": "Regra atualizada com sucesso"}
+        except HTTPException:
+            raise
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"Erro ao atualizar regra: {str(e)}")
 
 
 @router.delete("/regras/{tipo_regra}")
-def excluir_regra(tipo_regra: str):
+async def excluir_regra(tipo_regra: str):
     """Exclui uma regra de bonificação"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("DELETE FROM regras_bonus WHERE tipo = %s", (tipo_regra,))
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Regra não encontrada")
-        conn.commit()
-        return {"message": "Regra excluída com sucesso"}
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=f"Erro ao excluir regra: {str(e)}")
-    finally:
-        conn.close()
+    async with conexao() as db:
+        try:
+            if await db.execute("DELETE FROM regras_bonus WHERE tipo = %s", (tipo_regra,)) == 0:
+                raise HTTPException(status_code=404, detail="Regra não encontrada")
+            await db.commit()
+            invalidar_regras()
+            return {"message": "Regra excluída com sucesso"}
+        except HTTPException:
+            raise
+        except ErroBanco as e:
+            await db.rollback()
+            if e.constraint == "ocorrencias_tipo_fkey":
+                raise HTTPException(status_code=400, detail="Regra em uso por ocorrências registradas")
+            raise HTTPException(status_code=500, detail=f"Erro ao excluir regra: {str(e)}")
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"Erro ao excluir regra: {str(e)}")
+
+
+CATEGORIAS_REGRA = ("elimina", "limite", "percentual", "bonus")
+
+
+@router.post("/regras/simulacao")
+async def simular_alteracao_regras(simulacao: SimulacaoRegras):
+    """Compara o bônus de todos os funcionários com as regras atuais e propostas, sem gravar nada.
+
+    As regras propostas são as atuais com as de `regras` incluídas ou
+    substituídas e as de `remover` excluídas. Lista apenas os funcionários
+    cujo resultado muda.
+    """
+    propostas = dict((await obter_regras()).por_tipo)
+    for tipo in simulacao.remover:
+        propostas.pop(tipo, None)
+    for regra in simulacao.regras:
+        if regra.categoria not in CATEGORIAS_REGRA:
+            raise HTTPException(status_code=400, detail=f"Categoria inválida na regra {regra.tipo}")
+        if regra.categoria == "limite" and regra.limite is None:
+            raise HTTPException(status_code=400, detail=f"Regra {regra.tipo} da categoria limite precisa de limite")
+        propostas[regra.tipo] = Regra(regra.categoria, regra.desconto, regra.limite)
+
+    total = recebem_atual = recebem_proposto = perdem = passam_a_receber = 0
+    soma_atual = soma_proposta = 0.0
+    alterados = []
+    async for atual, proposto in simular_regras(simulacao.data_inicio, simulacao.data_fim, propostas):
+        total += 1
+        recebem_atual += atual['recebe_bonus']
+        recebem_proposto += proposto['recebe_bonus']
+        perdem += atual['recebe_bonus'] and not proposto['recebe_bonus']
+        passam_a_receber += proposto['recebe_bonus'] and not atual['recebe_bonus']
+        soma_atual += atual['bonus_percentual']
+        soma_proposta += proposto['bonus_percentual']
+
+        if atual['bonus_percentual'] != proposto['bonus_percentual'] or atual['detalhes'] != proposto['detalhes']:
+            alterados.append({
+                "funcionario_id": atual['funcionario_id'],
+                "nome": atual['nome'],
+                "bonus_atual": atual['bonus_percentual'],
+                "bonus_proposto": proposto['bonus_percentual'],
+                "variacao": round(proposto['bonus_percentual'] - atual['bonus_percentual'], 2),
+                "recebe_bonus_atual": atual['recebe_bonus'],
+                "recebe_bonus_proposto": proposto['recebe_bonus'],
+                "detalhes_proposto": proposto['detalhes']
+            })
+
+    alterados.sort(key=lambda a: (a['variacao'], a['funcionario_id']))
+    return {
+        "periodo": {"inicio": simulacao.data_inicio, "fim": simulacao.data_fim},
+        "resumo": {
+            "total_funcionarios": total,
+            "recebem_bonus_atual": recebem_atual,
+            "recebem_bonus_proposto": recebem_proposto,
+            "perdem_bonus": perdem,
+            "passam_a_receber": passam_a_receber,
+            "funcionarios_alterados": len(alterados),
+            "soma_bonus_atual": round(soma_atual, 2),
+            "soma_bonus_proposto": round(soma_proposta, 2),
+            "variacao_total": round(soma_proposta - soma_atual, 2),
+            "variacao_media": round((soma_proposta - soma_atual) / total, 2) if total else 0.0
+        },
+        "funcionarios": alterados
+    }
 
 
 @router.get("/bonus/{funcionario_id}")
-def calcular_bonus(
+async def calcular_bonus(
+    request: Request,
     funcionario_id: str,
     data_inicio: str = Query(..., description="Data início (YYYY-MM-DD)"),
     data_fim: str = Query(..., description="Data fim (YYYY-MM-DD)")
 ):
     """Calcula o bônus de um funcionário específico"""
-    resultado = calcular_bonus_funcionario(funcionario_id, data_inicio, data_fim)
-    if not resultado:
-        raise HTTPException(status_code=404, detail="Funcionário não encontrado")
-    return resultado
+    async with conexao() as db:
+        marca = await cache_relatorios.marca_dados(db)
+    chave = cache_relatorios.chave_relatorio(marca, "bonus", funcionario_id, data_inicio, data_fim)
+
+    async def calcular():
+        resultado = await calcular_bonus_funcionario(funcionario_id, data_inicio, data_fim)
+        if not resultado:
+            raise HTTPException(status_code=404, detail="Funcionário não encontrado")
+        return resultado
+
+    entrada = cache_relatorios.buscar(chave)
+    if entrada is None:
+        entrada = await cache_relatorios.calcular_unico(chave, calcular)
+    return cache_relatorios.responder(request, entrada)
+
+
+COLUNAS_CSV = [
+    "funcionario_id", "nome", "bonus_percentual", "recebe_bonus", "total_ocorrencias",
+    "atestados", "ocorrencias_anuladas", "bonus_positivos", "detalhes"
+]
+
+
+def _resumo(periodo, total, recebem):
+    return {
+        "periodo": {"inicio": periodo.data_inicio, "fim": periodo.data_fim},
+        "total_funcionarios": total,
+        "recebem_bonus": recebem,
+        "nao_recebem_bonus": total - recebem
+    }
+
+
+async def _stream_ndjson(periodo, resultados):
+    """Uma linha JSON por funcionário e o resumo na última linha"""
+    total = recebem = 0
+    async for resultado in resultados:
+        total += 1
+        recebem += resultado['recebe_bonus']
+        yield json.dumps(resultado, ensure_ascii=False) + "\n"
+    yield json.dumps({"resumo": _resumo(periodo, total, recebem)}, ensure_ascii=False) + "\n"
+
+
+async def _stream_csv(periodo, resultados):
+    """Uma linha CSV por funcionário e o resumo em linhas de comentário no final"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def linha(valores):
+        writer.writerow(valores)
+        texto = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return texto
+
+    yield linha(COLUNAS_CSV)
+
+    total = recebem = 0
+    async for resultado in resultados:
+        total += 1
+        recebem += resultado['recebe_bonus']
+        detalhes = "; ".join(f"{d['tipo']}: {d['impacto']}" for d in resultado['detalhes'])
+        yield linha([resultado[coluna] for coluna in COLUNAS_CSV[:-1]] + [detalhes])
+
+    resumo = _resumo(periodo, total, recebem)
+    yield f"# periodo={periodo.data_inicio}..{periodo.data_fim}\n"
+    for chave in ("total_funcionarios", "recebem_bonus", "nao_recebem_bonus"):
+        yield f"# {chave}={resumo[chave]}\n"
 
 
 @router.post("/relatorio/geral")
-def relatorio_geral(periodo: PeriodoRelatorio):
+async def relatorio_geral(
+    request: Request,
+    periodo: PeriodoRelatorio,
+    formato: Optional[str] = Query(None, description="ndjson ou csv para receber o relatório em streaming"),
+    agregados: Optional[str] = Query(
+        None, description="incluir: acrescenta os totais por função; somente: só os totais, sem a lista de funcionários"
+    )
+):
     """Gera relatório geral de todos os funcionários ativos"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
+    if formato not in (None, "ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Formato inválido (use ndjson ou csv)")
+    if agregados not in (None, "incluir", "somente"):
+        raise HTTPException(status_code=400, detail="Agregados inválido (use incluir ou somente)")
+    if agregados and formato:
+        raise HTTPException(status_code=400, detail="Agregados só estão disponíveis no relatório em JSON")
+
+    # O JSON completo vai para o cache (e pedidos iguais simultâneos fazem um
+    # único cálculo); os formatos em streaming não
+    if formato is None:
+        async with conexao() as db:
+            marca = await cache_relatorios.marca_dados(db)
+        chave = cache_relatorios.chave_relatorio(marca, "geral", periodo.data_inicio, periodo.data_fim, agregados)
+        entrada = cache_relatorios.buscar(chave)
+        if entrada is None:
+            entrada = await cache_relatorios.calcular_unico(chave, lambda: _gerar_relatorio(periodo, agregados))
+        return cache_relatorios.responder(request, entrada)
+
+    # Período fechado: responde com o bônus congelado no fechamento
+    async with conexao() as db:
+        fechamento = await buscar_fechamento(db, periodo.data_inicio, periodo.data_fim)
+    if fechamento:
+        resultados = iterar_fechamento(fechamento['id'])
+    else:
+        resultados = iterar_bonus_lote(periodo.data_inicio, periodo.data_fim)
+
+    if formato == "ndjson":
+        return StreamingResponse(
+            _stream_ndjson(periodo, resultados),
+            media_type="application/x-ndjson",
+            headers=_cabecalhos_fechamento(fechamento)
+        )
+    if formato == "csv":
+        return StreamingResponse(
+            _stream_csv(periodo, resultados),
+            media_type="text/csv",
+            headers={
+                "Content-Disposition": f'attachment; filename="relatorio_{periodo.data_inicio}_{periodo.data_fim}.csv"',
+                **_cabecalhos_fechamento(fechamento)
+            }
+        )
+
+
+async def _gerar_relatorio(periodo, agregados):
+    """Conteúdo do relatório geral em JSON"""
+    totais = resultados = None
+    async with conexao() as db:
+        fechamento = await buscar_fechamento(db, periodo.data_inicio, periodo.data_fim)
+        # Período fechado: os totais saem direto do bônus congelado, sem
+        # trazer os resultados de cada funcionário quando não são pedidos
+        if fechamento and agregados:
+            totais = await agregar_fechamento(db, fechamento['id'])
+
+    if not fechamento and agregados:
+        # Só o resumo de cada funcionário fica em memória quando a lista
+        # não vai na resposta
+        regras = (await obter_regras()).por_tipo
+        compactos = ResultadosCompactos(regras)
+        if agregados != "somente":
+            resultados = []
+        async for resultado in iterar_bonus_lote(periodo.data_inicio, periodo.data_fim, regras=regras):
+            compactos.acrescentar(resultado)
+            if resultados is not None:
+                resultados.append(resultado)
+        async with conexao() as db:
+            totais = await agregar_resultados(db, compactos)
+    elif not fechamento:
+        resultados = [resultado async for resultado in iterar_bonus_lote(periodo.data_inicio, periodo.data_fim)]
+    elif agregados != "somente":
+        resultados = [resultado async for resultado in iterar_fechamento(fechamento['id'])]
+
+    if resultados is None:
+        relatorio = _resumo(periodo, totais["geral"]["total_funcionarios"], totais["geral"]["recebem_bonus"])
+    else:
+        relatorio = _resumo(periodo, len(resultados), sum(1 for r in resultados if r['recebe_bonus']))
+    if agregados:
+        relatorio["agregados"] = totais
+    if agregados != "somente":
+        relatorio["funcionarios"] = resultados
+    if fechamento:
+        relatorio["fechamento"] = fechamento
+    return relatorio
+
+
+@router.post("/relatorio/tendencia")
+async def relatorio_tendencia(tendencia: TendenciaRelatorio):
+    """Bônus de todos os funcionários ativos mês a mês (ou semana a semana) no período"""
+    if tendencia.granularidade not in ("mes", "semana"):
+        raise HTTPException(status_code=400, detail="Granularidade inválida (use mes ou semana)")
     try:
-        cursor.execute("SELECT id FROM funcionarios WHERE ativo = TRUE")
-        funcionarios_ids = [row['id'] for row in cursor.fetchall()]
-    finally:
-        conn.close()
+        data_inicio = date.fromisoformat(tendencia.data_inicio)
+        data_fim = date.fromisoformat(tendencia.data_fim)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data inválida")
+    if data_inicio > data_fim:
+        raise HTTPException(status_code=400, detail="Data início deve ser anterior à data fim")
+
+    faixas = dividir_periodo(data_inicio, data_fim, tendencia.granularidade)
+    if len(faixas) > LIMITE_FAIXAS_TENDENCIA:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Período muito longo: no máximo {LIMITE_FAIXAS_TENDENCIA} faixas por consulta"
+        )
+
+    funcionarios = []
+    recebem = [0] * len(faixas)
+    somas = [0.0] * len(faixas)
+    async for funcionario_id, nome, resultados in iterar_tendencia(faixas):
+        funcionarios.append({
+            "funcionario_id": funcionario_id,
+            "nome": nome,
+            "bonus_percentual": [r['bonus_percentual'] for r in resultados],
+            "recebe_bonus": [r['recebe_bonus'] for r in resultados],
+            "total_ocorrencias": [r['total_ocorrencias'] for r in resultados]
+        })
+        for i, r in enumerate(resultados):
+            recebem[i] += r['recebe_bonus']
+            somas[i] += r['bonus_percentual']
+
+    total = len(funcionarios)
+    return {
+        "periodo": {"inicio": tendencia.data_inicio, "fim": tendencia.data_fim},
+        "granularidade": tendencia.granularidade,
+        "faixas": [
+            {
+                "inicio": inicio,
+                "fim": fim,
+                "recebem_bonus": recebem[i],
+                "media_bonus": round(somas[i] / total, 2) if total else 0.0
+            }
+            for i, (inicio, fim) in enumerate(faixas)
+        ],
+        "total_funcionarios": total,
+        "funcionarios": funcionarios
+    }
 
-    resultados = [calcular_bonus_funcionario(fid, periodo.data_inicio, periodo.data_fim)
-                  for fid in funcionarios_ids if calcular_bonus_funcionario(fid, periodo.data_inicio, periodo.data_fim)]
 
+def _cabecalhos_fechamento(fechamento):
+    if not fechamento:
+        return {}
     return {
-        "periodo": {"inicio": periodo.data_inicio, "fim": periodo.data_fim},
-        "total_funcionarios": len(resultados),
-        "recebem_bonus": sum(1 for r in resultados if r['recebe_bonus']),
-        "nao_recebem_bonus": sum(1 for r in resultados if not r['recebe_bonus']),
-        "funcionarios": resultados
-    }
\ No newline at end of file
+        "X-Periodo-Fechado": str(fechamento['id']),
+        "X-Alteracoes-Pos-Fechamento": str(fechamento['alteracoes_pendentes'])
+    }
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from app.database_async import estatisticas_banco
+from app.cache_relatorios import estatisticas_cache
+from app import cache_funcionarios
+from app.avisos_alteracao import estatisticas_avisos
+
+router = APIRouter()
+
+
+@router.get("/sistema/metricas")
+async def metricas():
+    """Retorna métricas internas do servidor"""
+    return {
+        "pool": estatisticas_banco(),
+        "cache_relatorios": estatisticas_cache(),
+        "cache_funcionarios": cache_funcionarios.estatisticas_cache(),
+        "avisos_alteracao": estatisticas_avisos()
+    }
@@ -0,0 +1,111 @@
+"""Verificação das tabelas de totais mantidas por triggers.
+
+Recalcula do zero, a partir das ocorrências, os totais mensais por
+funcionário (totais_mensais) e a série diária por tipo e função
+(totais_diarios), e lista cada linha em que o valor gravado pelos triggers
+diverge do recalculado. Com --corrigir, substitui a tabela divergente pelo
+recálculo (também serve para preencher a série de um banco antigo):
+
+    python -m app.totais [--corrigir]
+
+Escritas em ocorrências ficam bloqueadas enquanto a verificação roda.
+"""
+import sys
+from typing import Callable, List, NamedTuple
+
+from app import database
+from app.database import init_db
+
+
+class Totais(NamedTuple):
+    nome: str
+    tabela: str
+    esperados: str              # view com o recálculo a partir das ocorrências
+    chaves: List[str]
+    colunas: List[str]
+    descrever: Callable         # linha de divergência -> identificação da chave
+
+
+TOTAIS_MENSAIS = Totais(
+    "Totais mensais", "totais_mensais", "totais_mensais_esperados",
+    ["funcionario_id", "mes", "tipo"],
+    ["quantidade", "primeira_data", "primeiro_id", "anulacoes", "anulacoes_outro_mes"],
+    lambda d: f"Funcionário {d['funcionario_id']} {d['mes']:%m/%Y} {d['tipo']}"
+)
+
+TOTAIS_DIARIOS = Totais(
+    "Série diária", "totais_diarios", "totais_diarios_esperados",
+    ["data", "tipo", "funcao"],
+    ["quantidade"],
+    lambda d: f"{d['data']:%d/%m/%Y} {d['tipo']} {d['funcao'] or '(sem função)'}"
+)
+
+VERIFICACOES = [TOTAIS_MENSAIS, TOTAIS_DIARIOS]
+
+
+def verificar_totais(conn, totais, corrigir=False):
+    """Retorna as divergências entre a tabela de `totais` e o recálculo completo"""
+    cursor = conn.cursor()
+    try:
+        # Retrato consistente: nenhum trigger mexe nos totais durante a comparação
+        cursor.execute("LOCK TABLE ocorrencias IN SHARE MODE")
+        cursor.execute(f"""
+            CREATE TEMP TABLE {totais.tabela}_recalculados ON COMMIT DROP AS
+            SELECT * FROM {totais.esperados}
+        """)
+        cursor.execute(f"""
+            SELECT
+                {", ".join(f"COALESCE(g.{c}, r.{c}) AS {c}" for c in totais.chaves)},
+                {", ".join(f"g.{c} AS {c}_gravado, r.{c} AS {c}_esperado" for c in totais.colunas)}
+            FROM {totais.tabela} g
+            FULL JOIN {totais.tabela}_recalculados r
+                ON {" AND ".join(f"r.{c} = g.{c}" for c in totais.chaves)}
+            WHERE ({", ".join(f"g.{c}" for c in totais.colunas)})
+                IS DISTINCT FROM ({", ".join(f"r.{c}" for c in totais.colunas)})
+            ORDER BY {", ".join(str(i) for i in range(1, len(totais.chaves) + 1))}
+        """)
+        divergencias = cursor.fetchall()
+
+        if corrigir and divergencias:
+            cursor.execute(f"DELETE FROM {totais.tabela}")
+            cursor.execute(f"INSERT INTO {totais.tabela} SELECT * FROM {totais.tabela}_recalculados")
+        conn.commit()
+        return divergencias
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def main():
+    corrigir = "--corrigir" in sys.argv[1:]
+    init_db()
+
+    conn = database.get_db_connection()
+    try:
+        resultados = [(totais, verificar_totais(conn, totais, corrigir)) for totais in VERIFICACOES]
+    finally:
+        conn.close()
+        database.fechar_pool()
+
+    falhou = False
+    for totais, divergencias in resultados:
+        for d in divergencias:
+            diferencas = ", ".join(
+                f"{c}: {d[c + '_gravado']} != {d[c + '_esperado']}"
+                for c in totais.colunas if d[c + '_gravado'] != d[c + '_esperado']
+            )
+            print(f"{totais.descrever(d)}: {diferencas}")
+
+        if not divergencias:
+            print(f"✅ {totais.nome}: consistente")
+        elif corrigir:
+            print(f"🔧 {totais.nome}: {len(divergencias)} divergência(s) corrigida(s)")
+        else:
+            print(f"❌ {totais.nome}: {len(divergencias)} divergência(s) encontrada(s); rode com --corrigir para reconstruir")
+            falhou = True
+
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == "__main__":
+    main()
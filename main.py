@@ -25,7 +25,7 @@ sys.path.insert(0, BASE_DIR)
 # Agora importa as bibliotecas
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(title="Sistema de Bonificação")
@@ -117,17 +117,43 @@ except Exception as e:
 # Importa e configura as rotas - COM TRATAMENTO MELHORADO
 try:
     # Tenta importar os routers
-    from app.routers import funcionarios, ocorrencias, relatorios, dashboard
+    from app.routers import funcionarios, ocorrencias, relatorios, fechamentos, dashboard, sistema
     from app.database import init_db
+    from app.database_async import abrir_banco, fechar_banco
+    from app.contadores_dashboard import iniciar_reconciliacao, parar_reconciliacao
+    from app.avisos_alteracao import iniciar_escuta, parar_escuta
+    from app.database import PoolEsgotado
     
     # Inicializa o banco
     init_db()
     
+    # Abre o pool de conexões na subida e o encerra ao parar o servidor;
+    # a reconciliação periódica do dashboard e a escuta dos avisos de
+    # alteração de outros processos rodam só com o pool aberto
+    app.add_event_handler("startup", abrir_banco)
+    app.add_event_handler("startup", iniciar_reconciliacao)
+    app.add_event_handler("startup", iniciar_escuta)
+    app.add_event_handler("shutdown", parar_escuta)
+    app.add_event_handler("shutdown", parar_reconciliacao)
+    app.add_event_handler("shutdown", fechar_banco)
+    
+    # Pool sem conexão livre é sobrecarga, não defeito: 503 para o cliente tentar de novo
+    @app.exception_handler(PoolEsgotado)
+    async def pool_esgotado(request, exc):
+        print(f"⚠️ Pool de conexões esgotado: {exc}")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Servidor ocupado, tente novamente em instantes"},
+            headers={"Retry-After": "2"}
+        )
+    
     # Adiciona as rotas
     app.include_router(funcionarios.router, prefix="/api", tags=["Funcionários"])
     app.include_router(ocorrencias.router, prefix="/api", tags=["Ocorrências"])
     app.include_router(relatorios.router, prefix="/api", tags=["Relatórios"])
+    app.include_router(fechamentos.router, prefix="/api", tags=["Fechamentos"])
     app.include_router(dashboard.router, prefix="/api", tags=["Dashboard"])
+    app.include_router(sistema.router, prefix="/api", tags=["Sistema"])
     
     print("✅ Rotas da API carregadas")
     
@@ -328,7 +354,9 @@ def main():
         host="0.0.0.0", 
         port=8000,
         log_level="info",
-        access_log=True
+        access_log=True,
+        # Streams de eventos do dashboard nunca terminam sozinhos
+        timeout_graceful_shutdown=5
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+"""Confere se avaliar_matriz (NumPy) dá o mesmo resultado que aplicar_regras.
+
+Compara os dois avaliadores em matrizes e regras aleatórias, sem usar o
+banco. Rode na raiz do projeto:
+
+    python -m scripts.comparar_avaliadores [rodadas]
+"""
+import random
+import sys
+
+from app.bonus_vetorizado import (
+    SEM_OCORRENCIA, MatrizOcorrencias, _avaliar_matriz_python, avaliar_matriz, contadores_funcionario, np
+)
+from app.regras import Regra
+
+
+def matriz_aleatoria(funcionarios, tipos, gerador):
+    """Matriz sintética (sem banco) para comparar os dois avaliadores"""
+    quantidades, primeiras = [], []
+    for i in range(funcionarios):
+        qtds = [gerador.choice([0, 0, 0, 1, 2, 3, 5]) for _ in tipos]
+        posicoes = gerador.sample(range(1, 10 * len(tipos)), len(tipos))
+        quantidades.append(qtds)
+        primeiras.append([p if q else SEM_OCORRENCIA for p, q in zip(posicoes, qtds)])
+    return MatrizOcorrencias(
+        list(range(1, funcionarios + 1)), [f"Funcionário {i}" for i in range(1, funcionarios + 1)],
+        list(tipos), quantidades, primeiras, [0] * funcionarios
+    )
+
+
+def regras_aleatorias(tipos, gerador):
+    """Regras sintéticas com descontos fracionários (onde a ordem das somas aparece)"""
+    regras = {}
+    for tipo in tipos:
+        categoria = gerador.choice(["percentual", "percentual", "percentual", "bonus", "elimina", "limite"])
+        limite = None
+        if categoria == "limite":
+            limite = gerador.choice([1, 2, 3])
+        elif categoria == "bonus":
+            limite = gerador.choice([None, 1, 2, 3])
+        regras[tipo] = Regra(categoria, round(gerador.uniform(0.1, 45), 1), limite)
+    return regras
+
+
+def main():
+    if np is None:
+        print("⚠️ NumPy não instalado: só o avaliador linha a linha está em uso")
+        return
+    rodadas = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    gerador = random.Random(0)
+    tipos = ["atestado", "advertencia", "atraso", "avaria_menor", "falta", "supermeta_110", "supermeta_120"]
+    divergencias = 0
+    for _ in range(rodadas):
+        matriz = matriz_aleatoria(5000, tipos, gerador)
+        regras = regras_aleatorias(tipos, gerador)
+        vetorizado = avaliar_matriz(matriz, regras)
+        referencia = _avaliar_matriz_python(matriz, regras)
+        for i, funcionario_id in enumerate(matriz.funcionarios):
+            valores = tuple(lista[i] for lista in vetorizado)
+            esperados = tuple(lista[i] for lista in referencia)
+            if valores != esperados:
+                divergencias += 1
+                if divergencias <= 10:
+                    print(f"Funcionário {funcionario_id} {contadores_funcionario(matriz, i)}: {valores} != {esperados}")
+
+    if divergencias:
+        print(f"❌ {divergencias} divergência(s) entre os avaliadores")
+        sys.exit(1)
+    print(f"✅ Avaliadores equivalentes em {rodadas * 5000} funcionários")
+
+
+if __name__ == "__main__":
+    main()
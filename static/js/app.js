@@ -29,23 +29,45 @@ function mostrarAlerta(mensagem, tipo = 'success') {
 }
 
 // Dashboard
+// Os números chegam por Server-Sent Events: o primeiro evento traz o resumo
+// completo e os seguintes só o que mudou, então a tela não precisa recarregar
+let dashboard = null;
+let eventosDashboard = null;
+
+function exibirDashboard(data) {
+    document.getElementById('totalFuncionarios').textContent = data.total_funcionarios;
+    document.getElementById('ocorrenciasMes').textContent = data.ocorrencias_mes_atual;
+
+    if (data.ocorrencias_por_tipo.length > 0) {
+        document.getElementById('tipoMaisComum').textContent = 
+            data.ocorrencias_por_tipo[0].tipo.replace('_', ' ');
+    } else {
+        document.getElementById('tipoMaisComum').textContent = 'Nenhuma';
+    }
+}
+
 async function carregarDashboard() {
-    try {
-        const res = await fetch('/api/dashboard');
-        const data = await res.json();
-        
-        document.getElementById('totalFuncionarios').textContent = data.total_funcionarios;
-        document.getElementById('ocorrenciasMes').textContent = data.ocorrencias_mes_atual;
-        
-        if (data.ocorrencias_por_tipo.length > 0) {
-            document.getElementById('tipoMaisComum').textContent = 
-                data.ocorrencias_por_tipo[0].tipo.replace('_', ' ');
-        } else {
-            document.getElementById('tipoMaisComum').textContent = 'Nenhuma';
+    if (eventosDashboard) return;
+
+    if (!window.EventSource) {
+        // Navegador sem suporte a SSE: busca o resumo uma vez
+        try {
+            const res = await fetch('/api/dashboard');
+            exibirDashboard(await res.json());
+        } catch (error) {
+            console.error('Erro ao carregar dashboard:', error);
         }
-    } catch (error) {
-        console.error('Erro ao carregar dashboard:', error);
+        return;
     }
+
+    eventosDashboard = new EventSource('/api/dashboard/eventos');
+    eventosDashboard.addEventListener('dashboard', e => {
+        const dados = JSON.parse(e.data);
+        // Após uma reconexão o servidor manda o resumo completo de novo
+        dashboard = dashboard ? {...dashboard, ...dados} : dados;
+        exibirDashboard(dashboard);
+    });
+    eventosDashboard.onerror = () => console.error('Conexão com o dashboard perdida; reconectando...');
 }
 
 // Funcionários
@@ -315,20 +337,34 @@ async function registrarOcorrencia(e) {
     }
 }
 
-async function carregarOcorrencias() {
+// Paginação da lista de ocorrências
+const CAMPOS_LISTA_OCORRENCIAS = 'id,data,nome_funcionario,tipo,observacao,anula_ocorrencia_id,ocorrencia_anulada';
+let linhasOcorrencias = '';
+let cursorOcorrencias = null;
+
+async function carregarOcorrencias(maisPaginas = false) {
     try {
-        const res = await fetch('/api/ocorrencias');
-        const ocorrencias = await res.json();
+        let url = `/api/ocorrencias?limite=50&fields=${CAMPOS_LISTA_OCORRENCIAS}`;
+        if (maisPaginas && cursorOcorrencias) {
+            url += `&cursor=${encodeURIComponent(cursorOcorrencias)}`;
+        } else {
+            linhasOcorrencias = '';
+        }
+
+        const res = await fetch(url);
+        const pagina = await res.json();
+        const ocorrencias = pagina.itens;
+        cursorOcorrencias = pagina.proximo_cursor;
         
-        if (ocorrencias.length === 0) {
+        if (ocorrencias.length === 0 && !linhasOcorrencias) {
             document.getElementById('listaOcorrencias').innerHTML = 
                 '<p style="text-align:center;color:#666;">Nenhuma ocorrência registrada</p>';
             return;
         }
 
-        let html = '<table><thead><tr><th>Data</th><th>Funcionário</th><th>Tipo</th><th>Observação</th><th>Anulação</th><th>Ação</th></tr></thead><tbody>';
+        let html = '';
         
-        ocorrencias.slice(0, 50).forEach(o => {
+        ocorrencias.forEach(o => {
             let anulacaoInfo = '-';
             if (o.anula_ocorrencia_id && o.ocorrencia_anulada) {
                 const dataAnulada = o.ocorrencia_anulada.data.split('-').reverse().join('/');
@@ -366,8 +402,14 @@ async function carregarOcorrencias() {
             </tr>`;
         });
         
-        html += '</tbody></table>';
-        document.getElementById('listaOcorrencias').innerHTML = html;
+        linhasOcorrencias += html;
+
+        let tabela = '<table><thead><tr><th>Data</th><th>Funcionário</th><th>Tipo</th><th>Observação</th><th>Anulação</th><th>Ação</th></tr></thead><tbody>';
+        tabela += linhasOcorrencias + '</tbody></table>';
+        if (cursorOcorrencias) {
+            tabela += '<div style="text-align:center;margin-top:15px;"><button class="btn btn-primary" onclick="carregarOcorrencias(true)">Carregar mais</button></div>';
+        }
+        document.getElementById('listaOcorrencias').innerHTML = tabela;
 
     } catch (error) {
         console.error('Erro ao carregar ocorrências:', error);
@@ -396,23 +438,37 @@ async function deletarOcorrencia(id) {
 }
 
 // Relatórios
+// Último relatório recebido: o servidor responde 304 se ele ainda vale
+let ultimoRelatorio = null;
+
 async function gerarRelatorio(e) {
     e.preventDefault();
     
     const dataInicio = document.getElementById('relDataInicio').value;
     const dataFim = document.getElementById('relDataFim').value;
+    const periodo = `${dataInicio}_${dataFim}`;
 
     try {
+        const headers = {'Content-Type': 'application/json'};
+        if (ultimoRelatorio && ultimoRelatorio.periodo === periodo) {
+            headers['If-None-Match'] = ultimoRelatorio.etag;
+        }
         const res = await fetch('/api/relatorio/geral', {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
+            headers,
             body: JSON.stringify({
                 data_inicio: dataInicio,
                 data_fim: dataFim
             })
         });
 
-        const relatorio = await res.json();
+        let relatorio;
+        if (res.status === 304) {
+            relatorio = ultimoRelatorio.dados;
+        } else {
+            relatorio = await res.json();
+            ultimoRelatorio = {periodo, etag: res.headers.get('ETag'), dados: relatorio};
+        }
         
         let html = `
             <div style="background:#f8f9fa;padding:20px;border-radius:8px;margin-bottom:20px;">